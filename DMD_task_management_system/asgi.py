@@ -9,8 +9,22 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DMD_task_management_system.settings')
 
-application = get_asgi_application()
+# The same setup as django.core.asgi.get_asgi_application(), which returns the plain handler
+django.setup(set_prefix=False)
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+
+
+class AsyncViewsASGIHandler(ASGIHandler):
+    # Requests resolve against the URLs of the async views, WSGI keeps serving the sync ones
+    async def get_response_async(self, request):
+        request.urlconf = settings.ASGI_URLCONF
+        return await super().get_response_async(request)
+
+
+application = AsyncViewsASGIHandler()
@@ -0,0 +1,14 @@
+"""
+URL configuration for requests served over ASGI, where the read views of tasks run natively async.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+from tasks import async_urls as tasks_urls
+from tasks import async_views as tasks_views
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('tasks/', include(tasks_urls)),
+    path('', tasks_views.home_page, name='home'),
+]
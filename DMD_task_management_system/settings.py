@@ -38,9 +38,11 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'tasks.apps.TasksConfig',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'tasks.instrumentation.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,10 +53,12 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'DMD_task_management_system.urls'
+# Served by DMD_task_management_system.asgi, with the async variants of the read views
+ASGI_URLCONF = 'DMD_task_management_system.asgi_urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'tasks.instrumentation.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,9 +82,72 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Readers don't block the writer in WAL mode, and a writer waits for another one
+            # instead of failing at once. NORMAL only syncs at checkpoints, which WAL keeps safe.
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA busy_timeout=5000;',
+            # Transactions take the write lock when they start, so one that read first never fails
+            # to upgrade its lock halfway through, which the busy timeout can't wait out
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# The rendered sidebar is cached per tree version. LocMemCache is per process,
+# so deployments with several worker processes should use FileBasedCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+TASKS_SIDEBAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+# With TASKS_SIDEBAR_DEPTH set, task trees render only that many levels and at most
+# TASKS_SIDEBAR_PAGE_SIZE subtasks per task; the rest is loaded when expanded.
+TASKS_SIDEBAR_DEPTH = None
+TASKS_SIDEBAR_PAGE_SIZE = 100
+
+# Requests kept per view for the rolling query metrics summary
+TASKS_METRICS_WINDOW = 100
+# Views that exceed their @query_budget raise QueryBudgetExceeded instead of logging a warning
+TASKS_QUERY_BUDGETS_STRICT = False
+
+# Deleting a task with its subtasks removes them in transactions of at most this many tasks
+TASKS_DELETE_CHUNK_SIZE = 500
+
+# Exports fetch this many rows per query, so memory stays flat on any table size
+TASKS_EXPORT_CHUNK_SIZE = 2000
+
+# Task list pages, which are paginated with a cursor, so every page costs the same
+TASKS_LIST_LIMIT = 50
+TASKS_LIST_MAX_LIMIT = 500
+
+# Search returns this many best ranked tasks by default, and never more than the maximum
+TASKS_SEARCH_LIMIT = 20
+TASKS_SEARCH_MAX_LIMIT = 100
+
+# Performers suggested while typing a name
+TASKS_PERFORMER_SUGGESTIONS = 10
+
+# With background rollups, saving a task only queues its ancestors, and run_rollup_worker
+# recomputes their subtree totals, at most this many tasks per transaction
+TASKS_BACKGROUND_ROLLUPS = False
+TASKS_ROLLUP_BATCH_SIZE = 500
+
+# Times a save calculates a task's totals again when other writes rolled up into them meanwhile.
+# IMMEDIATE transactions above serialize the writers, so this only matters without them.
+TASKS_SAVE_RETRIES = 3
+
+# Writes that still find the database locked after the busy timeout are retried this many times,
+# waiting twice as long before every next attempt
+TASKS_WRITE_RETRIES = 5
+TASKS_WRITE_RETRY_DELAY = 0.05
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
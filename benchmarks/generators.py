@@ -0,0 +1,55 @@
+import random
+from collections import deque
+
+CREATED_AT = '2025-01-01T09:00:00+00:00'
+DEADLINE = '2025-01-31T18:00:00+00:00'
+
+
+def task_row(task_id, parent_id):
+    # Everything is in progress, so that any subtree can be completed
+    return {
+        'id': task_id,
+        'parent': parent_id,
+        'title': f'Task {task_id}',
+        'description': 'Generated for benchmarks',
+        'performers': 'Benchmark',
+        'deadline': DEADLINE,
+        'status': 'PR',
+        'created_at': CREATED_AT,
+    }
+
+
+def deep(size, depth=500):
+    yield task_row(1, None)
+    for task_id in range(2, size + 1):
+        parent_id = task_id - 1 if (task_id - 2) % depth else 1
+        yield task_row(task_id, parent_id)
+
+
+def wide(size):
+    yield task_row(1, None)
+    for task_id in range(2, size + 1):
+        yield task_row(task_id, 1)
+
+
+def mixed(size, max_depth=6, seed=0):
+    # Projects broken down a few levels deep, where a task has either no subtasks or a handful of them
+    rng = random.Random(seed)
+    task_id = 0
+    while task_id < size:
+        task_id += 1
+        yield task_row(task_id, None)
+        queue = deque([(task_id, 0)])
+        while queue and task_id < size:
+            parent_id, depth = queue.popleft()
+            if depth == max_depth:
+                continue
+            for _ in range(rng.choice((0, 0, 2, 3, 5, 8))):
+                if task_id == size:
+                    break
+                task_id += 1
+                yield task_row(task_id, parent_id)
+                queue.append((task_id, depth + 1))
+
+
+SHAPES = {'deep': deep, 'wide': wide, 'mixed': mixed}
@@ -0,0 +1,159 @@
+import asyncio
+import datetime
+import itertools
+import json
+import multiprocessing
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from tasks.models import Task
+from tasks.transactions import is_locked
+from .generators import SHAPES
+
+
+def load_shape(shape, size):
+    call_command('flush', interactive=False, verbosity=0)
+    with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as file:
+        file.writelines(json.dumps(row) + '\n' for row in SHAPES[shape](size))
+        file.flush()
+        call_command('import_tasks', file.name, stdout=StringIO())
+
+
+def get_requests():
+    root = Task.objects.filter(parent=None).order_by('id').first()
+    return [
+        ('/', {}),
+        (root.get_absolute_url(), {'X-Requested-With': 'XMLHttpRequest'}),
+        (root.get_json_url(), {}),
+        (f'/tasks/list?subtree_of={root.id}&sort=deadline', {}),
+        (f'/tasks/{root.id}/subtasks/', {}),
+    ]
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return {'p50': statistics.median(latencies), 'p95': latencies[max(int(len(latencies) * 0.95) - 1, 0)]}
+
+
+def summarize(results, elapsed):
+    return {
+        'requests': len(results),
+        'errors': sum(status_code != 200 for latency, status_code in results),
+        'throughput': len(results) / elapsed,
+        **percentiles([latency for latency, status_code in results]),
+    }
+
+
+def run_wsgi(requests, concurrency, count):
+    # Every thread is a worker of a threaded WSGI server, with a client and a connection of its own
+    local = threading.local()
+
+    def send(request):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        path, headers = request
+        started_at = time.perf_counter()
+        response = local.client.get(path, headers=headers)
+        return time.perf_counter() - started_at, response.status_code
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(send, itertools.islice(itertools.cycle(requests), count)))
+    return summarize(results, time.perf_counter() - started_at)
+
+
+async def run_asgi(requests, concurrency, count):
+    # One event loop serves every request, like a single ASGI server process
+    client = AsyncClient()
+    pending = itertools.islice(itertools.cycle(requests), count)
+    results = []
+
+    async def worker():
+        for path, headers in pending:
+            started_at = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            results.append((time.perf_counter() - started_at, response.status_code))
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(results, time.perf_counter() - started_at)
+
+
+def run(shape, size, concurrency_levels, count):
+    load_shape(shape, size)
+    requests = get_requests()
+    results = {}
+    for concurrency in concurrency_levels:
+        results[f'wsgi/{concurrency}'] = run_wsgi(requests, concurrency, count)
+        with override_settings(ROOT_URLCONF=settings.ASGI_URLCONF):
+            results[f'asgi/{concurrency}'] = asyncio.run(run_asgi(requests, concurrency, count))
+    return results
+
+
+def create_chain(depth):
+    parent = None
+    for level in range(depth):
+        parent = Task(title=f'Level {level}', description='Load test', performers='Load test',
+                      deadline=timezone.now() + datetime.timedelta(days=30), parent=parent)
+        parent.save()
+    return parent
+
+
+def write(writer, parent_id, count):
+    # Every writer is a process of its own, adding subtasks under the same parent and editing them,
+    # so all of them roll up into the same chain of ancestors
+    random.seed(writer)
+    latencies, lock_errors, added = [], 0, []
+    for i in range(count):
+        started_at = time.perf_counter()
+        try:
+            if added and i % 2:
+                task = Task.objects.get(id=random.choice(added))
+                task.deadline += datetime.timedelta(hours=1)
+                task.save()
+            else:
+                task = Task(title=f'Writer {writer} task {i}', description='Load test', performers=f'Writer {writer}',
+                            deadline=timezone.now() + datetime.timedelta(days=1), parent_id=parent_id)
+                task.save()
+                added.append(task.id)
+        except OperationalError as e:
+            if not is_locked(e):
+                raise
+            lock_errors += 1
+        latencies.append(time.perf_counter() - started_at)
+    connection.close()
+    return latencies, lock_errors, len(added)
+
+
+def run_writers(processes, count, depth=5):
+    parent = create_chain(depth)
+    # Forked processes must not share the connection of this one
+    connections.close_all()
+
+    started_at = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        results = pool.starmap(write, [(writer, parent.id, count) for writer in range(processes)])
+    elapsed = time.perf_counter() - started_at
+
+    latencies = [latency for writer_latencies, lock_errors, added in results for latency in writer_latencies]
+    root = Task.objects.get(id=parent.ancestor_ids[0] if parent.ancestor_ids else parent.id)
+    return {
+        'writes': len(latencies),
+        'lock_errors': sum(lock_errors for writer_latencies, lock_errors, added in results),
+        'throughput': len(latencies) / elapsed,
+        **percentiles(latencies),
+        # Every task that made it into the table has to be counted by the root
+        'lost_rollups': Task.objects.count() - root.subtree_size,
+    }
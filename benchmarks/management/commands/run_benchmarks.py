@@ -0,0 +1,65 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from benchmarks import suite
+from benchmarks.generators import SHAPES
+
+BASELINE = os.path.join(os.path.dirname(suite.__file__), 'baseline.json')
+
+
+class Command(BaseCommand):
+    help = ('Runs the benchmarks on synthetic task trees in a throwaway test database '
+            'and compares the results with a stored baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+        parser.add_argument('--size', type=int, default=1000, help='Number of tasks in every generated tree')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of every repeatable benchmark')
+        parser.add_argument('--sidebar-depth', type=int, default=20,
+                            help='TASKS_SIDEBAR_DEPTH for the rendered pages, the sidebar template '
+                                 'cannot recurse through deep chains all at once')
+        parser.add_argument('--output', help='Path to write the results to as JSON')
+        parser.add_argument('--baseline', default=BASELINE)
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed slowdown against the baseline, 0.2 means 20%%')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+
+    def handle(self, *args, **options):
+        # Without a baseline there is nothing to compare with, and the run would pass whatever it measured
+        if not options['save_baseline'] and not os.path.exists(options['baseline']):
+            raise CommandError(f'No baseline at {options["baseline"]}, run with --save-baseline to create it')
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                                   TASKS_SIDEBAR_DEPTH=options['sidebar_depth']):
+                results = suite.run(options['shapes'], options['size'], options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        for name, result in results.items():
+            line = f'{name:<40} {result["time"] * 1000:>10.1f}ms {result["queries"]:>6} queries'
+            if name in baseline:
+                line += f' ({(result["time"] / baseline[name]["time"] - 1) * 100:+.0f}%)'
+            self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as file:
+                json.dump({**baseline, **results}, file, indent=2)
+            return
+
+        regressions = suite.compare(results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from benchmarks import load
+from benchmarks.generators import SHAPES
+
+
+class Command(BaseCommand):
+    help = ('Sends concurrent requests to the read views in a throwaway test database, once through '
+            'the sync views in threads like a threaded WSGI server, and once through the async views '
+            'on one event loop like an ASGI server, and reports the throughput and latencies of both.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shape', choices=SHAPES, default='mixed')
+        parser.add_argument('--size', type=int, default=1000, help='Number of tasks in the generated tree')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--requests', type=int, default=500, help='Requests sent at every concurrency level')
+        parser.add_argument('--sidebar-depth', type=int, default=20)
+        parser.add_argument('--output', help='Path to write the results to as JSON')
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                                   TASKS_SIDEBAR_DEPTH=options['sidebar_depth']):
+                results = load.run(options['shape'], options['size'], options['concurrency'], options['requests'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<12} {result["throughput"]:>8.1f} req/s  p50 {result["p50"] * 1000:>7.1f}ms  '
+                f'p95 {result["p95"] * 1000:>7.1f}ms  {result["errors"]} errors'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from benchmarks import load
+
+
+class Command(BaseCommand):
+    help = ('Runs processes that write tasks at the same time into a throwaway SQLite file, with the '
+            'configured connection options and with stock ones, and reports the throughput, the latencies, '
+            'the writes that failed on a locked database and the rollups that got lost.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--writes', type=int, default=100, help='Writes of every writer process')
+        parser.add_argument('--depth', type=int, default=5, help='Ancestors every write rolls up into')
+        parser.add_argument('--modes', nargs='+', choices=['configured', 'stock'], default=['configured', 'stock'])
+        parser.add_argument('--output', help='Path to write the results to as JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in options['modes']:
+            for writers in options['writers']:
+                name = f'{mode}/{writers}'
+                results[name] = self.run(mode, writers, options['writes'], options['depth'])
+                result = results[name]
+                self.stdout.write(
+                    f'{name:<16} {result["throughput"]:>8.1f} writes/s  p50 {result["p50"] * 1000:>7.1f}ms  '
+                    f'p95 {result["p95"] * 1000:>7.1f}ms  {result["lock_errors"]} lock errors  '
+                    f'{result["lost_rollups"]} lost rollups'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def run(self, mode, writers, writes, depth):
+        # Processes only share a database in a file, and a fresh one for every run,
+        # since WAL mode stays with the file once it is set
+        settings_dict = connection.settings_dict
+        old_options, old_test_name = settings_dict['OPTIONS'], settings_dict['TEST']['NAME']
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict['TEST']['NAME'] = os.path.join(directory, 'load.sqlite3')
+            # Stock SQLite is connected to without any options, so with a rollback journal
+            # and deferred transactions, and nothing retries the writes
+            if mode == 'stock':
+                settings_dict['OPTIONS'] = {}
+            connection.close()
+
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                retries = 0 if mode == 'stock' else settings.TASKS_WRITE_RETRIES
+                with override_settings(TASKS_WRITE_RETRIES=retries):
+                    return load.run_writers(writers, writes, depth)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                settings_dict['OPTIONS'], settings_dict['TEST']['NAME'] = old_options, old_test_name
+                connection.close()
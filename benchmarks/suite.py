@@ -0,0 +1,109 @@
+import datetime
+import json
+import statistics
+import tempfile
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from tasks.models import Task
+from .generators import SHAPES
+
+
+def measure(func, repeat=1):
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started_at = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started_at)
+    # Query counts are taken from the last run, after any caches have been filled
+    return {'time': statistics.median(timings), 'queries': len(queries)}
+
+
+def new_subtask(parent, number):
+    return Task(parent=parent, title=f'Benchmark subtask {number}', description='Added by the benchmark',
+                performers='Benchmark', deadline=parent.deadline)
+
+
+def run_shape(shape, size, repeat):
+    call_command('flush', interactive=False, verbosity=0)
+    cache.clear()
+    results = {}
+
+    with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as file:
+        file.writelines(json.dumps(row) + '\n' for row in SHAPES[shape](size))
+        file.flush()
+        results['import'] = measure(lambda: call_command('import_tasks', file.name, stdout=StringIO()))
+
+    root = Task.objects.filter(parent=None).order_by('id').first()
+    leaf = Task.objects.order_by('-depth', 'id').first()
+    client = Client()
+
+    def home_page():
+        cache.clear()
+        client.get('/')
+    results['home_page'] = measure(home_page, repeat)
+
+    results['task_detail'] = measure(
+        lambda: client.get(root.get_absolute_url(), headers={'X-Requested-With': 'XMLHttpRequest'}), repeat
+    )
+
+    # Every generated title starts with "Task", so the search ranks a large share of the table
+    results['search'] = measure(lambda: client.get('/tasks/search', {'q': 'task 1'}), repeat)
+
+    def save():
+        leaf.deadline += datetime.timedelta(hours=1)
+        leaf.save()
+    results['save'] = measure(save, repeat)
+
+    subtasks = []
+    def add_subtask():
+        subtasks.append(new_subtask(leaf, len(subtasks)))
+        subtasks[-1].save()
+    results['add_subtask'] = measure(add_subtask, repeat)
+
+    results['delete'] = measure(lambda: subtasks.pop().delete(), repeat)
+    # Deleting a task with subtasks also detaches its subtree
+    def task_with_subtasks():
+        return Task.objects.filter(parent=root, task__isnull=False).order_by('id').first()
+
+    task = task_with_subtasks()
+    if task is not None:
+        results['delete_with_subtasks'] = measure(task.delete)
+    task = task_with_subtasks()
+    if task is not None:
+        results['delete_subtree'] = measure(task.delete_subtree)
+
+    def complete():
+        root.status = Task.Status.COMPLETED
+        root.save()
+    results['complete'] = measure(complete)
+
+    return results
+
+
+def run(shapes, size, repeat):
+    results = {}
+    for shape in shapes:
+        for name, result in run_shape(shape, size, repeat).items():
+            results[f'{shape}-{size}/{name}'] = result
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['time'] > expected['time'] * (1 + threshold):
+            regressions.append(f'{name}: {expected["time"] * 1000:.1f}ms -> {result["time"] * 1000:.1f}ms')
+        if result['queries'] > expected['queries']:
+            regressions.append(f'{name}: {expected["queries"]} -> {result["queries"]} queries')
+    return regressions
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from benchmarks import load, suite
+from benchmarks.generators import SHAPES, deep, mixed, wide
+from benchmarks.management.commands import run_benchmarks
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class GeneratorsTest(TestCase):
+    def assert_parents_come_first(self, rows):
+        seen = set()
+        for row in rows:
+            self.assertTrue(row['parent'] is None or row['parent'] in seen)
+            seen.add(row['id'])
+
+    def test_generates_requested_number_of_tasks(self):
+        for shape in (deep, wide, mixed):
+            rows = list(shape(250))
+            self.assertEqual([row['id'] for row in rows], list(range(1, 251)))
+            self.assert_parents_come_first(rows)
+
+    def test_deep_generates_chains(self):
+        rows = list(deep(21, depth=10))
+        self.assertEqual([row['parent'] for row in rows[:3]], [None, 1, 2])
+        self.assertEqual(rows[11]['parent'], 1)
+
+    def test_wide_generates_one_level(self):
+        self.assertEqual({row['parent'] for row in wide(50)}, {None, 1})
+
+    def test_mixed_is_reproducible(self):
+        self.assertEqual(list(mixed(100)), list(mixed(100)))
+        self.assertNotEqual(list(mixed(100)), list(mixed(100, seed=1)))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class SuiteTest(TestCase):
+    BENCHMARKS = ('import', 'home_page', 'task_detail', 'search', 'save', 'add_subtask',
+                  'delete', 'delete_with_subtasks', 'delete_subtree', 'complete')
+
+    def test_measures_every_benchmark(self):
+        results = suite.run(['mixed'], 30, 1)
+
+        self.assertEqual(set(results), {f'mixed-30/{name}' for name in self.BENCHMARKS})
+        for result in results.values():
+            self.assertGreater(result['time'], 0)
+            self.assertGreater(result['queries'], 0)
+
+    def test_reports_regressions_over_threshold(self):
+        baseline = {'a': {'time': 1.0, 'queries': 5}, 'b': {'time': 1.0, 'queries': 5}}
+        results = {'a': {'time': 1.1, 'queries': 5}, 'b': {'time': 1.3, 'queries': 6}, 'c': {'time': 9, 'queries': 9}}
+
+        regressions = suite.compare(results, baseline, threshold=0.2)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(regression.startswith('b: ') for regression in regressions))
+
+    def test_baseline_covers_every_benchmark(self):
+        with open(run_benchmarks.BASELINE) as file:
+            baseline = json.load(file)
+
+        self.assertLessEqual({f'mixed-1000/{name}' for name in self.BENCHMARKS}, set(baseline))
+        for shape in SHAPES:
+            self.assertIn(f'{shape}-1000/home_page', baseline)
+
+
+# The load test sends requests from other threads, which only see committed data
+class LoadTest(TransactionTestCase):
+    def test_compares_wsgi_and_asgi(self):
+        results = load.run('mixed', 30, [1, 3], 10)
+
+        self.assertEqual(set(results), {'wsgi/1', 'asgi/1', 'wsgi/3', 'asgi/3'})
+        for result in results.values():
+            self.assertEqual(result['requests'], 10)
+            self.assertEqual(result['errors'], 0)
+            self.assertGreater(result['throughput'], 0)
+            self.assertLessEqual(result['p50'], result['p95'])
+
+
+# Writer processes only share a database in a file, while the test database lives in memory,
+# so the command runs in a process of its own with the configured connection options
+class WriterLoadTest(SimpleTestCase):
+    def test_configured_writers_dont_hit_locks_or_lose_rollups(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            subprocess.run([sys.executable, 'manage.py', 'run_writer_load_test', '--writers', '2', '--writes', '10',
+                            '--modes', 'configured', '--output', output],
+                           cwd=settings.BASE_DIR, check=True, capture_output=True)
+            with open(output) as file:
+                result = json.load(file)['configured/2']
+
+        self.assertEqual(result['writes'], 20)
+        self.assertEqual(result['lock_errors'], 0)
+        self.assertEqual(result['lost_rollups'], 0)
@@ -0,0 +1,18 @@
+from django.urls import path
+
+from tasks import async_views
+from tasks.urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'task_detail': async_views.task_detail,
+    'task_json': async_views.task_json,
+    'task_list': async_views.task_list,
+    'subtasks': async_views.subtasks,
+    'root_tasks': async_views.subtasks,
+}
+
+# The same routes as tasks.urls, the views that only write keep running through the sync adapter
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,108 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views.decorators.cache import cache_control
+
+from . import views
+from .forms import TaskForm
+from .instrumentation import query_budget
+from .listing import alist_tasks
+from .models import Task
+from .serializers import serialize_task
+
+# Templates are rendered by the sync adapter, so a template that still touches the database,
+# like the sidebar on a cache miss, does it from a thread where that is allowed
+arender = sync_to_async(render)
+arender_to_string = sync_to_async(render_to_string)
+
+
+async def arender_home_page(request, **context):
+    task_detail_form = context.get('task_detail_form')
+    if task_detail_form is not None:
+        await Task.objects.atree(root=task_detail_form.instance, **views.get_tree_options())
+
+    return await arender(request, 'tasks/home.html', views.get_home_page_context(**context))
+
+
+def acondition(etag_func):
+    # django.views.decorators.http.condition calls etag_func synchronously, even around async views
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if etag is not None and request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return decorator
+
+
+@query_budget(1)
+async def home_page(request):
+    return await arender_home_page(request)
+
+
+@query_budget(10)
+async def task_detail(request, task_id):
+    # Saving runs in transactions, which only the sync view can open
+    if request.method == 'POST':
+        return await sync_to_async(views.task_detail)(request, task_id)
+
+    task = await aget_object_or_404(Task.objects.with_stale_totals(), id=task_id)
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    if is_ajax:
+        await Task.objects.atree(root=task, **views.get_tree_options())
+        form = await arender_to_string('tasks/task_detail.html',
+                                       {'task_detail_form': TaskForm(instance=task), 'subtask_form': TaskForm()},
+                                       request=request)
+        return JsonResponse({'form': form, 'url': task.get_absolute_url()})
+
+    return await arender_home_page(request, task_detail_form=TaskForm(instance=task), subtask_form=TaskForm())
+
+
+async def task_etag(request, task_id):
+    tasks = [task async for task in views.get_etag_tasks(task_id)]
+    task = next((task for task in tasks if task.id == task_id), None)
+    if task is None:
+        return None
+    return views.hash_etag(tasks, await task.aget_overdue_count())
+
+
+@query_budget(5)
+@cache_control(no_cache=True)
+@acondition(etag_func=task_etag)
+async def task_json(request, task_id):
+    task = await aget_object_or_404(Task.objects.with_stale_totals(), id=task_id)
+    subtasks = [subtask async for subtask in task.task_set.annotate(subtask_count=Count('task')).order_by('id')]
+    return JsonResponse(serialize_task(task, subtasks, await task.aget_overdue_count()))
+
+
+@query_budget(1)
+async def task_list(request):
+    try:
+        return JsonResponse(await alist_tasks(request.GET, views.get_list_limit(request)))
+    except ValidationError as e:
+        return JsonResponse({'errors': e.message_dict}, status=400)
+
+
+@query_budget(2)
+async def subtasks(request, task_id=None):
+    if task_id is not None:
+        await aget_object_or_404(Task, id=task_id)
+
+    after = request.GET.get('after', '')
+    tasks, has_more = await Task.objects.apage(task_id,
+                                               after=int(after) if after.isdigit() else None,
+                                               page_size=settings.TASKS_SIDEBAR_PAGE_SIZE)
+    return await arender(request, 'tasks/subtasks.html', views.get_subtasks_context(task_id, tasks, has_more))
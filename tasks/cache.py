@@ -0,0 +1,56 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+TREE_VERSION_KEY = 'tasks:tree_version'
+SIDEBAR_KEY = 'tasks:sidebar:{version}'
+SIDEBAR_HITS_KEY = 'tasks:sidebar:hits'
+SIDEBAR_MISSES_KEY = 'tasks:sidebar:misses'
+
+
+def new_tree_version():
+    return uuid.uuid4().hex
+
+
+def get_tree_version():
+    return cache.get_or_set(TREE_VERSION_KEY, new_tree_version, timeout=None)
+
+
+def bump_tree_version():
+    # A fresh token rather than incr(), which file and database caches do as a
+    # separate get and set: two commits could both store the same next version,
+    # and a sidebar rendered between them would outlive the second one.
+    transaction.on_commit(lambda: cache.set(TREE_VERSION_KEY, new_tree_version(), timeout=None))
+
+
+def count(key):
+    # Only for statistics, an increment lost to a concurrent one doesn't matter
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_sidebar(render):
+    key = SIDEBAR_KEY.format(version=get_tree_version())
+    sidebar = cache.get(key)
+    if sidebar is None:
+        count(SIDEBAR_MISSES_KEY)
+        sidebar = render()
+        cache.set(key, sidebar, settings.TASKS_SIDEBAR_CACHE_TIMEOUT)
+    else:
+        count(SIDEBAR_HITS_KEY)
+    return sidebar
+
+
+def get_sidebar_stats():
+    hits = cache.get(SIDEBAR_HITS_KEY, 0)
+    misses = cache.get(SIDEBAR_MISSES_KEY, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+        'tree_version': get_tree_version(),
+    }
@@ -0,0 +1,69 @@
+import csv
+import json
+
+from django.db.models import Q
+
+from .models import Task, subtree_lookup
+from .serializers import serialize_datetime, serialize_duration
+
+# The columns are named the way import_tasks reads them
+COLUMNS = {
+    'id': 'id',
+    'parent': 'parent_id',
+    'title': 'title',
+    'description': 'description',
+    'performers': 'performers',
+    'status': 'status',
+    'deadline': 'deadline',
+    'created_at': 'created_at',
+    'completed_at': 'completed_at',
+    'planned_labor_intensity': 'planned_labor_intensity',
+    'actual_completion_time': 'actual_completion_time',
+}
+DATETIME_COLUMNS = ('deadline', 'created_at', 'completed_at')
+DURATION_COLUMNS = ('planned_labor_intensity', 'actual_completion_time')
+
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def export_queryset(task=None, subtree=True):
+    tasks = Task.objects.all()
+    if task is not None:
+        tasks = tasks.filter(Q(id=task.id) | subtree_lookup(task.subtree_path) if subtree else Q(id=task.id))
+    # Sorting by path puts every task before its subtasks
+    return tasks.order_by('path', 'id').values_list(*COLUMNS.values())
+
+
+def export_rows(tasks, chunk_size, root=None):
+    for values in tasks.iterator(chunk_size=chunk_size):
+        row = dict(zip(COLUMNS, values))
+        # The parent of an exported subtree isn't in the file, so its root is imported as a root
+        if root is not None and row['id'] == root.id:
+            row['parent'] = None
+        for column in DATETIME_COLUMNS:
+            row[column] = serialize_datetime(row[column])
+        for column in DURATION_COLUMNS:
+            row[column] = serialize_duration(row[column])
+        yield row
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def export_lines(export_format, task=None, subtree=True, chunk_size=2000):
+    rows = export_rows(export_queryset(task, subtree), chunk_size, root=task)
+    return csv_lines(rows) if export_format == 'csv' else ndjson_lines(rows)
@@ -1,5 +1,5 @@
 from django import forms
-from tasks.models import Task
+from tasks.models import ConcurrentUpdateError, Task
 
 
 class EmptyFieldErrorMessage:
@@ -11,6 +11,9 @@ class EmptyFieldErrorMessage:
 
 
 class TaskForm(forms.ModelForm):
+    # The version of the task the form was rendered with, so that saving it can't overwrite newer edits
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
     class Meta:
         model = Task
         fields = ('title', 'description', 'performers', 'deadline', 'status')
@@ -25,6 +28,8 @@ class TaskForm(forms.ModelForm):
             }),
             'performers': forms.fields.TextInput(attrs={
                 'placeholder': 'Performers',
+                'list': 'performer-suggestions',
+                'autocomplete': 'off',
             }),
             'deadline': forms.fields.DateTimeInput(attrs={
                 'placeholder': 'e.g. 2025-01-25 14:30',
@@ -42,3 +47,12 @@ class TaskForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         forms.ModelForm.__init__(self, *args, **kwargs)
         self.fields['status'].widget.choices.blank_choice = []
+        if self.instance.pk is not None:
+            self.fields['version'].initial = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        version = cleaned_data.get('version')
+        if self.instance.pk is not None and version is not None and version != self.instance.version:
+            raise ConcurrentUpdateError()
+        return cleaned_data
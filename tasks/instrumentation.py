@@ -0,0 +1,201 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(queries):
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.duplicates = 0
+        self.similar = 0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.statements = set()
+        self.sql = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started_at
+            self.queries += 1
+
+            # Similar queries only differ in their parameters, which is what an N+1 loop looks like
+            statement = (sql, repr(params))
+            self.duplicates += statement in self.statements
+            self.similar += sql in self.sql
+            self.statements.add(statement)
+            self.sql.add(sql)
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'dup;desc="{self.duplicates} duplicate, {self.similar} similar queries"',
+            f'tpl;dur={self.render_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+
+class MetricsSummary:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(lambda: deque(maxlen=settings.TASKS_METRICS_WINDOW))
+
+    def record(self, view_name, metrics):
+        with self.lock:
+            self.views[view_name].append(
+                (metrics.queries, metrics.db_time, metrics.duplicates, metrics.similar,
+                 metrics.render_time, metrics.total_time)
+            )
+
+    def get(self):
+        with self.lock:
+            views = {view_name: list(requests) for view_name, requests in self.views.items()}
+
+        summary = {}
+        for view_name, requests in views.items():
+            queries, db_time, duplicates, similar, render_time, total_time = zip(*requests)
+            summary[view_name] = {
+                'requests': len(requests),
+                'queries_avg': sum(queries) / len(requests),
+                'queries_max': max(queries),
+                'duplicates_max': max(duplicates),
+                'similar_max': max(similar),
+                'db_time_avg_ms': sum(db_time) / len(requests) * 1000,
+                'render_time_avg_ms': sum(render_time) / len(requests) * 1000,
+                'total_time_avg_ms': sum(total_time) / len(requests) * 1000,
+                'total_time_max_ms': max(total_time) * 1000,
+            }
+        return summary
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+
+summary = MetricsSummary()
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started_at = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            metrics.total_time = time.perf_counter() - started_at
+            current_metrics.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        started_at = time.perf_counter()
+        recorder = await sync_to_async(self.install_recorder)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(self.remove_recorder)(recorder)
+            metrics.total_time = time.perf_counter() - started_at
+            current_metrics.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    # Async views run their queries in the thread of the sync adapter, which has a connection of its own,
+    # so the recorder is installed on that connection for the duration of the request. Concurrent requests
+    # can share that thread, so every recorder only counts the queries of its own request and is removed
+    # by identity rather than in the order it was installed.
+    @staticmethod
+    def install_recorder(metrics):
+        def recorder(execute, sql, params, many, context):
+            if current_metrics.get() is not metrics:
+                return execute(sql, params, many, context)
+            return metrics(execute, sql, params, many, context)
+
+        connection.execute_wrappers.append(recorder)
+        return recorder
+
+    @staticmethod
+    def remove_recorder(recorder):
+        connection.execute_wrappers.remove(recorder)
+
+    def process_metrics(self, request, response, metrics):
+        # Streaming responses run their queries after this point, so only the view itself is measured
+        response['Server-Timing'] = metrics.server_timing()
+        response['X-Query-Count'] = metrics.queries
+
+        resolver_match = request.resolver_match
+        if resolver_match is not None:
+            summary.record(resolver_match.view_name, metrics)
+            self.check_budget(resolver_match, metrics)
+        return response
+
+    def check_budget(self, resolver_match, metrics):
+        budget = getattr(resolver_match.func, 'query_budget', None)
+        if budget is None or metrics.queries <= budget:
+            return
+
+        message = (f'The view "{resolver_match.view_name}" ran {metrics.queries} queries '
+                   f'({metrics.similar} similar), its budget is {budget}.')
+        if settings.TASKS_QUERY_BUDGETS_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+
+        started_at = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_time += time.perf_counter() - started_at
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    # Only the templates rendered by views come through the backend, includes are
+    # loaded by the engine, so nested renders aren't counted twice
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -0,0 +1,169 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, Subquery, TextField, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .export import COLUMNS, DATETIME_COLUMNS, DURATION_COLUMNS
+from .models import Task, performer_key
+from .serializers import serialize_datetime, serialize_duration
+
+FIELDS = {
+    **COLUMNS,
+    'depth': 'depth',
+    'version': 'version',
+    **{field: field for field in Task.STATUS_COUNT_FIELDS.values()},
+}
+# Large text, description above all, is only loaded when it is asked for
+DEFAULT_FIELDS = ['id', 'parent', 'title', 'status', 'deadline']
+# Every sort key has an index, and the id makes the order total, so a cursor points between two rows
+SORT_KEYS = ['id', 'created_at', 'deadline']
+
+
+def parse_datetime_param(name, value):
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: f'"{value}" is not a valid date and time.'})
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def parse_id_param(name, value):
+    if not value.isdigit():
+        raise ValidationError({name: f'"{value}" is not a task id.'})
+    return int(value)
+
+
+def filter_tasks(tasks, params):
+    if params.get('status'):
+        statuses = params['status'].split(',')
+        invalid = [status for status in statuses if status not in Task.Status.values]
+        if invalid:
+            raise ValidationError({'status': f'Unknown statuses: {", ".join(invalid)}.'})
+        tasks = tasks.filter(status__in=statuses)
+    if params.get('open') == '1':
+        tasks = tasks.open()
+
+    if params.get('deadline_after'):
+        tasks = tasks.filter(deadline__gte=parse_datetime_param('deadline_after', params['deadline_after']))
+    if params.get('deadline_before'):
+        tasks = tasks.filter(deadline__lt=parse_datetime_param('deadline_before', params['deadline_before']))
+
+    if params.get('performer'):
+        performer = params['performer']
+        if performer.isdigit():
+            tasks = tasks.filter(assignees=int(performer))
+        else:
+            tasks = tasks.filter(assignees__key=performer_key(performer))
+
+    if params.get('parent') == 'root':
+        tasks = tasks.roots()
+    elif params.get('parent'):
+        tasks = tasks.filter(parent_id=parse_id_param('parent', params['parent']))
+
+    if params.get('subtree_of'):
+        task_id = parse_id_param('subtree_of', params['subtree_of'])
+        # The bounds of the subtree range are read in the same query, they are constants to the index range
+        task = Task.objects.filter(id=task_id)
+        start = Concat('path', Cast('id', TextField()), Value('/'), output_field=TextField())
+        end = Concat('path', Cast('id', TextField()), Value('0'), output_field=TextField())
+        tasks = tasks.filter(Q(id=task_id) | Q(path__gte=Subquery(task.values(start=start)),
+                                                path__lt=Subquery(task.values(end=end))))
+    return tasks
+
+
+def parse_sort(value):
+    descending = value.startswith('-')
+    key = value.removeprefix('-')
+    if key not in SORT_KEYS:
+        raise ValidationError({'sort': f'Tasks can be sorted by {", ".join(SORT_KEYS)}, with "-" for descending.'})
+    return key, descending
+
+
+def parse_fields(value):
+    if not value:
+        return DEFAULT_FIELDS
+    fields = value.split(',')
+    invalid = [field for field in fields if field not in FIELDS]
+    if invalid:
+        raise ValidationError({'fields': f'Unknown fields: {", ".join(invalid)}.'})
+    return fields
+
+
+def encode_cursor(sort, values):
+    key, task_id = values[sort], values['id']
+    if sort in DATETIME_COLUMNS:
+        key = key.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort, key, task_id]).encode()).decode()
+
+
+def decode_cursor(cursor, sort):
+    try:
+        cursor_sort, key, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValidationError({'cursor': 'The cursor is invalid.'})
+    if cursor_sort != sort:
+        raise ValidationError({'cursor': 'The cursor belongs to another sort order.'})
+    if not isinstance(task_id, int) or (sort in DATETIME_COLUMNS and not isinstance(key, str)):
+        raise ValidationError({'cursor': 'The cursor is invalid.'})
+    if sort in DATETIME_COLUMNS:
+        key = parse_datetime_param('cursor', key)
+    return key, task_id
+
+
+def paginate(tasks, sort, descending, cursor):
+    direction = '-' if descending else ''
+    tasks = tasks.order_by(f'{direction}{sort}', f'{direction}id')
+    if cursor is None:
+        return tasks
+
+    key, task_id = decode_cursor(cursor, sort)
+    if sort == 'id':
+        return tasks.filter(id__lt=task_id) if descending else tasks.filter(id__gt=task_id)
+    # The first condition alone is an index range, the second one only drops the ties already seen
+    if descending:
+        return tasks.filter(Q(**{f'{sort}__lte': key}), Q(**{f'{sort}__lt': key}) | Q(id__lt=task_id))
+    return tasks.filter(Q(**{f'{sort}__gte': key}), Q(**{f'{sort}__gt': key}) | Q(id__gt=task_id))
+
+
+def list_queryset(params):
+    sort, descending = parse_sort(params.get('sort') or 'id')
+    fields = parse_fields(params.get('fields'))
+    tasks = paginate(filter_tasks(Task.objects.all(), params), sort, descending, params.get('cursor'))
+    # The sort key and the id are always read, the next cursor is made of them
+    columns = dict.fromkeys([*(FIELDS[field] for field in fields), sort, 'id'])
+    return tasks.values(*columns), sort, fields
+
+
+def list_tasks(params, limit):
+    tasks, sort, fields = list_queryset(params)
+    return build_page(list(tasks[:limit + 1]), sort, fields, limit)
+
+
+async def alist_tasks(params, limit):
+    tasks, sort, fields = list_queryset(params)
+    return build_page([row async for row in tasks[:limit + 1]], sort, fields, limit)
+
+
+def build_page(rows, sort, fields, limit):
+    results = []
+    for values in rows[:limit]:
+        row = {field: values[FIELDS[field]] for field in fields}
+        for field in DATETIME_COLUMNS:
+            if field in row:
+                row[field] = serialize_datetime(row[field])
+        for field in DURATION_COLUMNS:
+            if field in row:
+                row[field] = serialize_duration(row[field])
+        results.append(row)
+
+    return {
+        'results': results,
+        'next': encode_cursor(sort, rows[limit - 1]) if len(rows) > limit else None,
+    }
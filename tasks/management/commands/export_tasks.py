@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.export import CONTENT_TYPES, export_lines
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Exports tasks with their computed durations to CSV or NDJSON, ordered so that tasks precede their subtasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', type=int, help='Id of the task to export together with its subtree')
+        parser.add_argument('--no-subtree', action='store_true', help='Export only the task given by --task')
+        parser.add_argument('--format', choices=CONTENT_TYPES, help='Defaults to the output file extension, or csv')
+        parser.add_argument('--output', help='Path to the output file, defaults to stdout')
+        parser.add_argument('--chunk-size', type=int, default=settings.TASKS_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        export_format = options['format'] or ('ndjson' if output and output.endswith('.ndjson') else 'csv')
+
+        task = None
+        if options['task'] is not None:
+            try:
+                task = Task.objects.get(id=options['task'])
+            except Task.DoesNotExist:
+                raise CommandError(f'Task {options["task"]} does not exist.')
+
+        lines = export_lines(export_format, task, not options['no_subtree'], options['chunk_size'])
+        if output:
+            with open(output, 'w', newline='', encoding='utf-8') as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
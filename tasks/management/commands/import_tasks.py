@@ -0,0 +1,224 @@
+import contextlib
+import csv
+import datetime
+import itertools
+import json
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tasks.models import Task, assign_performers
+
+FIELDS = ('title', 'description', 'performers', 'deadline', 'status', 'created_at', 'completed_at')
+TOTAL_FIELDS = (*Task.SUBTREE_TOTAL_FIELDS, 'actual_completion_time')
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+def parse_id(value):
+    task_id = int(value)
+    if task_id <= 0:
+        raise ValueError
+    return task_id
+
+
+def parse_datetime_value(value):
+    if not isinstance(value, str) or not value:
+        return value or None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    # Unparsable values are left as they are, so that clean_fields() reports them
+    if parsed is None:
+        return value
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = ('Imports tasks from a CSV or NDJSON file. Every row needs a positive integer "id", '
+            'and subtasks refer to the "id" of their task in the "parent" column, '
+            'so tasks must come before their subtasks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Path to the file, or "-" to read from stdin')
+        parser.add_argument('--format', choices=READERS, help='Defaults to the file extension')
+        parser.add_argument('--parent', type=int, help='Id of an existing task to import the top-level tasks under')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        file_format = options['format'] or ('csv' if options['file'].endswith('.csv') else 'ndjson')
+
+        self.root = None
+        if options['parent'] is not None:
+            try:
+                self.root = Task.objects.get(id=options['parent'])
+            except Task.DoesNotExist:
+                raise CommandError(f'Task {options["parent"]} does not exist.')
+
+        if options['file'] == '-':
+            file = contextlib.nullcontext(sys.stdin)
+        else:
+            file = open(options['file'], newline='', encoding='utf-8')
+
+        started_at = time.perf_counter()
+        with file, transaction.atomic():
+            count = self.import_tasks(READERS[file_format](file), options['batch_size'], started_at)
+        elapsed = time.perf_counter() - started_at
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {count} tasks in {elapsed:.2f}s ({count / elapsed:.0f} rows/s).'
+        ))
+
+    def import_tasks(self, rows, batch_size, started_at):
+        # Source ids are shifted past every existing id, so subtasks find their parents in the
+        # database. Only the parent and the totals of every imported task are kept for the rollup.
+        self.offset = Task.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        self.now = timezone.now()
+        self.batch_size = batch_size
+        self.parent_ids = {}
+        self.totals = {}
+
+        count = 0
+        rows = enumerate(rows, start=1)
+        while batch := list(itertools.islice(rows, batch_size)):
+            try:
+                tasks = Task.objects.bulk_create(self.build_tasks(batch))
+                assign_performers(tasks)
+            except IntegrityError as e:
+                raise CommandError(f'Rows {batch[0][0]}-{batch[-1][0]}: {e}')
+            count += len(batch)
+
+            if self.verbosity > 1:
+                self.stdout.write(f'{count} rows ({count / (time.perf_counter() - started_at):.0f} rows/s)')
+
+        if count:
+            self.roll_up()
+        return count
+
+    def build_tasks(self, batch):
+        batch = [(line, self.parse_row(line, row)) for line, row in batch]
+        parent_ids = {parent_id for line, (task_id, parent_id, row) in batch if parent_id is not None}
+        parents = {
+            parent.id: parent
+            for parent in Task.objects.filter(id__in=parent_ids, id__gt=self.offset)
+                                      .only('id', 'path', 'depth', 'status', 'completed_at')
+        }
+
+        tasks = []
+        for line, (task_id, parent_id, row) in batch:
+            if parent_id is None:
+                parent = self.root
+            elif parent_id in parents:
+                parent = parents[parent_id]
+            else:
+                raise CommandError(
+                    f'Row {line}: the parent task {parent_id - self.offset} must come before its subtasks.'
+                )
+
+            task = self.build_task(line, task_id, parent, row)
+            parents[task.id] = task
+            tasks.append(task)
+            self.parent_ids[task.id] = parent_id
+            self.totals[task.id] = {field: getattr(task, field) for field in TOTAL_FIELDS}
+        return tasks
+
+    def parse_row(self, line, row):
+        if not isinstance(row, dict):
+            raise CommandError(f'Row {line}: expected an object.')
+        try:
+            task_id = parse_id(row.get('id'))
+            parent_id = parse_id(row['parent']) if row.get('parent') not in (None, '') else None
+        except (TypeError, ValueError):
+            raise CommandError(f'Row {line}: "id" and "parent" must be positive integers.')
+        return self.offset + task_id, parent_id and self.offset + parent_id, row
+
+    def build_task(self, line, task_id, parent, row):
+        task = Task(id=task_id, parent=parent, **{
+            field: row[field] for field in FIELDS if row.get(field) not in (None, '')
+        })
+        task.deadline = parse_datetime_value(task.deadline)
+        task.created_at = parse_datetime_value(task.created_at) or self.now
+        task.completed_at = parse_datetime_value(task.completed_at)
+        try:
+            task.clean_fields(exclude=['parent'])
+        except ValidationError as e:
+            raise CommandError(f'Row {line}: {e.message_dict}')
+
+        # Completing a task completes its subtasks, so they have to be in progress or already completed
+        if parent is not None and parent.status == Task.Status.COMPLETED:
+            if task.status == Task.Status.IN_PROGRESS:
+                task.status = Task.Status.COMPLETED
+                task.completed_at = task.completed_at or parent.completed_at
+            elif task.status != Task.Status.COMPLETED:
+                raise CommandError(
+                    f'Row {line}: the subtask "{task.title}" cannot be completed. '
+                    'The status "Completed" can only be set after the status "In Progress".'
+                )
+
+        task.path = parent.subtree_path if parent is not None else ''
+        task.depth = parent.depth + 1 if parent is not None else 0
+        for field, own_total in task.get_own_totals().items():
+            setattr(task, field, own_total)
+        if task.status == Task.Status.COMPLETED:
+            task.completed_at = task.completed_at or self.now
+            task.actual_completion_time = task.completed_at - task.created_at
+        else:
+            task.completed_at = None
+        return task
+
+    def roll_up(self):
+        # Subtasks come after their tasks, so walking the rows backwards adds every subtree
+        # up completely before it is added to its task
+        parents = set()
+        root_totals = dict.fromkeys(Task.SUBTREE_TOTAL_FIELDS, 0)
+        root_totals['planned_labor_intensity'] = datetime.timedelta(0)
+        for task_id, parent_id in reversed(self.parent_ids.items()):
+            totals = self.totals[task_id]
+            if parent_id is None:
+                for field in root_totals:
+                    root_totals[field] += totals[field]
+                continue
+
+            parents.add(parent_id)
+            parent_totals = self.totals[parent_id]
+            for field, total in totals.items():
+                # Only completed tasks have a completion time, and their subtasks are all completed
+                if parent_totals[field] is not None and total is not None:
+                    parent_totals[field] += total
+
+        # One prepared UPDATE run for every task. bulk_update() would build a CASE with a branch per task
+        # for every field, which SQLite then evaluates for every row, and costs more than the import itself.
+        quote_name = connection.ops.quote_name
+        fields = [Task._meta.get_field(field) for field in TOTAL_FIELDS]
+        assignments = ', '.join(f'{quote_name(field.column)} = %s' for field in fields)
+        table, pk = quote_name(Task._meta.db_table), quote_name(Task._meta.pk.column)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {table} SET {assignments} WHERE {pk} = %s',
+                [
+                    [*(field.get_db_prep_value(self.totals[task_id][field.name], connection) for field in fields),
+                     task_id]
+                    for task_id in parents
+                ],
+            )
+        if self.root is not None:
+            Task.objects.filter(id__in=[*self.root.ancestor_ids, self.root.id]).rollup(**root_totals)
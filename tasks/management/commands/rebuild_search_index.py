@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from tasks.search import check_index, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index from the tasks table, then merges it into one segment.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-optimize', action='store_true',
+                            help='Skip merging the index, which takes longer than the rebuild on large tables')
+        parser.add_argument('--check', action='store_true',
+                            help='Only check that the index matches the tasks table')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            try:
+                check_index()
+            except DatabaseError as e:
+                raise CommandError(f'The search index is out of sync, run rebuild_search_index: {e}')
+            self.stdout.write('The search index is in sync.')
+            return
+
+        rebuild_index(optimize=not options['no_optimize'])
+        self.stdout.write(self.style.SUCCESS('Rebuilt the search index.'))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.models import RollupJob
+from tasks.rollups import run_rollup_jobs
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the subtree totals of the tasks queued by saves with TASKS_BACKGROUND_ROLLUPS, '
+            'deepest tasks first, in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TASKS_ROLLUP_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as the queue is empty')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        while True:
+            started_at = time.perf_counter()
+            count = run_rollup_jobs(options['batch_size'])
+            if count and verbosity > 1:
+                stats = RollupJob.objects.stats()
+                self.stdout.write(f'Recomputed {count} tasks in {time.perf_counter() - started_at:.2f}s, '
+                                  f'{stats["depth"]} queued, lag {stats["lag"]:.1f}s')
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
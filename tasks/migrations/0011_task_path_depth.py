@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+
+    children = {}
+    for task_id, parent_id in Task.objects.values_list('id', 'parent_id'):
+        children.setdefault(parent_id, []).append(task_id)
+
+    tasks = []
+    stack = [(task_id, '', 0) for task_id in children.get(None, [])]
+    while stack:
+        task_id, path, depth = stack.pop()
+        tasks.append(Task(id=task_id, path=path, depth=depth))
+        stack.extend((subtask_id, f'{path}{task_id}/', depth + 1) for subtask_id in children.get(task_id, []))
+
+    Task.objects.bulk_update(tasks, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_task_actual_completion_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='path',
+            field=models.TextField(blank=True, db_index=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
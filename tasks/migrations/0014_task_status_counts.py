@@ -0,0 +1,64 @@
+# Generated by Django 5.1 on 2026-10-17 23:39
+
+from django.db import migrations, models
+
+STATUS_COUNT_FIELDS = {
+    'AS': 'assigned_count',
+    'PR': 'in_progress_count',
+    'SP': 'suspended_count',
+    'CM': 'completed_count',
+}
+
+
+def fill_status_counts(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+
+    tasks = {}
+    parents = {}
+    for task_id, parent_id, status, depth in Task.objects.values_list('id', 'parent_id', 'status', 'depth'):
+        task = Task(id=task_id, **dict.fromkeys(STATUS_COUNT_FIELDS.values(), 0))
+        setattr(task, STATUS_COUNT_FIELDS.get(status, 'assigned_count'), 1)
+        tasks[task_id] = (depth, task)
+        parents[task_id] = parent_id
+
+    # Subtasks are counted before their parents, so each subtree total is complete when it is added up
+    for depth, task in sorted(tasks.values(), key=lambda item: item[0], reverse=True):
+        parent_id = parents[task.id]
+        if parent_id is not None:
+            parent = tasks[parent_id][1]
+            for field in STATUS_COUNT_FIELDS.values():
+                setattr(parent, field, getattr(parent, field) + getattr(task, field))
+
+    Task.objects.bulk_update([task for depth, task in tasks.values()], list(STATUS_COUNT_FIELDS.values()),
+                             batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_alter_task_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='assigned_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='in_progress_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='suspended_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_status_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# An external content FTS5 table stores only the index, the text is read from tasks_task.
+# Triggers keep it in sync with every write, including bulk_create and queryset updates and deletes,
+# and the update trigger skips the many writes that only change rollups, versions or paths.
+# SQLite drops the triggers when a migration rebuilds tasks_task, such a migration has to create them again.
+CREATE_SEARCH_INDEX = [
+    """
+    CREATE VIRTUAL TABLE tasks_task_fts USING fts5(
+        title, description, performers,
+        content='tasks_task', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER tasks_task_fts_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts(rowid, title, description, performers)
+        VALUES (new.id, new.title, new.description, new.performers);
+    END
+    """,
+    """
+    CREATE TRIGGER tasks_task_fts_delete AFTER DELETE ON tasks_task BEGIN
+        INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description, performers)
+        VALUES ('delete', old.id, old.title, old.description, old.performers);
+    END
+    """,
+    """
+    CREATE TRIGGER tasks_task_fts_update AFTER UPDATE OF title, description, performers ON tasks_task
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description
+        OR old.performers IS NOT new.performers
+    BEGIN
+        INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description, performers)
+        VALUES ('delete', old.id, old.title, old.description, old.performers);
+        INSERT INTO tasks_task_fts(rowid, title, description, performers)
+        VALUES (new.id, new.title, new.description, new.performers);
+    END
+    """,
+    "INSERT INTO tasks_task_fts(tasks_task_fts) VALUES ('rebuild')",
+]
+
+DROP_SEARCH_INDEX = [
+    'DROP TRIGGER tasks_task_fts_update',
+    'DROP TRIGGER tasks_task_fts_delete',
+    'DROP TRIGGER tasks_task_fts_insert',
+    'DROP TABLE tasks_task_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_task_status_counts'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SEARCH_INDEX, DROP_SEARCH_INDEX),
+    ]
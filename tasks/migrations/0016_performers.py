@@ -0,0 +1,52 @@
+# Generated by Django 5.1 on 2026-10-17 23:46
+
+import re
+
+from django.db import migrations, models
+
+PERFORMER_SEPARATORS_RE = re.compile(r'[,;\n]')
+
+
+def parse_performers(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    Performer = apps.get_model('tasks', 'Performer')
+    Assignment = Task.assignees.through
+
+    names = {}
+    assignments = set()
+    for task_id, performers in Task.objects.values_list('id', 'performers').iterator(chunk_size=2000):
+        for name in PERFORMER_SEPARATORS_RE.split(performers or ''):
+            name = ' '.join(name.split())
+            if name:
+                key = name.casefold()
+                names.setdefault(key, name)
+                assignments.add((task_id, key))
+
+    Performer.objects.bulk_create([Performer(key=key, name=name) for key, name in names.items()], batch_size=1000)
+    performer_ids = dict(Performer.objects.values_list('key', 'id'))
+    Assignment.objects.bulk_create([Assignment(task_id=task_id, performer_id=performer_ids[key])
+                                    for task_id, key in assignments], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0015_task_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Performer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('key', models.TextField(unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='assignees',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='tasks', to='tasks.performer'),
+        ),
+        migrations.RunPython(parse_performers, migrations.RunPython.noop),
+    ]
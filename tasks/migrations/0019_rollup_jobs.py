@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 00:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0018_task_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enqueued_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rollup_job', to='tasks.task')),
+            ],
+        ),
+    ]
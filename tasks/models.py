@@ -1,10 +1,273 @@
+import contextlib
+import contextvars
 import datetime
+import itertools
+import re
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
+from django.db.models import Case, Count, Exists, F, Min, OuterRef, Q, Sum, Value, When, Window
+from django.db.models.functions import Concat, RowNumber, Substr
 from django.urls import reverse
 from django.utils import timezone
 
+from .cache import bump_tree_version
+from .transactions import retry_when_locked
+
+
+delete_receivers_suspended = contextvars.ContextVar('delete_receivers_suspended', default=False)
+# Tasks whose subtree totals are recomputed when the deferred_rollups() block ends
+deferred_rollup_ids = contextvars.ContextVar('deferred_rollup_ids', default=None)
+
+
+@contextlib.contextmanager
+def suspend_delete_receivers():
+    token = delete_receivers_suspended.set(True)
+    try:
+        yield
+    finally:
+        delete_receivers_suspended.reset(token)
+
+
+class ConcurrentUpdateError(ValidationError):
+    def __init__(self):
+        super().__init__('The task was changed by someone else while you were editing it. '
+                         'Reload it to see their changes.', code='conflict')
+
+
+class StaleTotals(Exception):
+    pass
+
+
+def parse_path(path):
+    return [int(task_id) for task_id in path.split('/') if task_id]
+
+
+def subtree_lookup(path):
+    # Paths are '/'-terminated, and '0' is the character right after '/',
+    # so a whole subtree is one contiguous range of the path index.
+    return Q(path__gte=path, path__lt=path[:-1] + '0')
+
+
+PERFORMER_SEPARATORS_RE = re.compile(r'[,;\n]')
+
+
+def performer_key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def parse_performers(text):
+    # Performers are entered as one line of names separated by commas or semicolons
+    performers = {}
+    for name in PERFORMER_SEPARATORS_RE.split(text or ''):
+        name = ' '.join(name.split())
+        if name:
+            performers.setdefault(performer_key(name), name)
+    return performers
+
+
+def assign_performers(tasks, replace=False):
+    names = {task.id: parse_performers(task.performers) for task in tasks}
+    performers = Performer.objects.for_names(
+        {key: name for task_names in names.values() for key, name in task_names.items()}
+    )
+
+    Assignment = Task.assignees.through
+    if replace:
+        Assignment.objects.filter(task_id__in=names).delete()
+    Assignment.objects.bulk_create([
+        Assignment(task_id=task_id, performer_id=performers[key].id)
+        for task_id, task_names in names.items() for key in task_names
+    ])
+
+
+def roll_up(task_ids, **deltas):
+    if deferred_rollup_ids.get() is not None:
+        if any(deltas.values()):
+            deferred_rollup_ids.get().update(task_ids)
+        return
+    if not settings.TASKS_BACKGROUND_ROLLUPS:
+        return Task.objects.filter(id__in=task_ids).rollup(**deltas)
+    # The queued tasks are recomputed from their subtasks, so the deltas only tell whether anything changed
+    if task_ids and any(deltas.values()):
+        RollupJob.objects.enqueue(task_ids)
+
+
+class TaskTree:
+    def __init__(self, tasks, root=None, page_size=None):
+        self.nodes = {}
+        self.roots = []
+        self.has_more = False
+
+        if root is not None:
+            self.add(root, self.roots)
+        # Parents come before their subtasks, so a task whose parent was cut off by
+        # the page size is dropped together with its whole subtree.
+        for task in tasks:
+            if task.parent_id is None or task.parent_id == getattr(root, 'id', None):
+                parent = root
+                subtasks = root._subtasks if root is not None else self.roots
+            elif task.parent_id in self.nodes:
+                parent = self.nodes[task.parent_id]
+                subtasks = parent._subtasks
+            else:
+                continue
+
+            if page_size is not None and len(subtasks) == page_size:
+                if parent is None:
+                    self.has_more = True
+                else:
+                    parent.has_more_subtasks = True
+                continue
+            self.add(task, subtasks)
+
+    def add(self, task, subtasks):
+        task._subtasks = []
+        task.has_more_subtasks = False
+        self.nodes[task.id] = task
+        subtasks.append(task)
+
+    def __iter__(self):
+        return iter(self.roots)
+
+    def __len__(self):
+        return len(self.roots)
+
+    def __getitem__(self, task_id):
+        return self.nodes[task_id]
+
+
+class TaskQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        bump_tree_version()
+        kwargs.setdefault('version', F('version') + 1)
+        return super().update(**kwargs)
+
+    def update_derived(self, **kwargs):
+        # Totals and paths follow from other rows, they change without anyone editing
+        # the task, so they don't make a new version that edits would conflict with
+        bump_tree_version()
+        return super().update(**kwargs)
+
+    def bulk_create(self, *args, **kwargs):
+        bump_tree_version()
+        return super().bulk_create(*args, **kwargs)
+
+    def tree_queryset(self, root=None, depth=None, page_size=None):
+        tasks = self.only(*self.model.TREE_FIELDS)
+        if root is not None:
+            tasks = tasks.filter(subtree_lookup(root.subtree_path))
+        if depth is not None:
+            top_depth = root.depth + 1 if root is not None else 0
+            tasks = tasks.filter(depth__lt=top_depth + depth).annotate(subtask_count=Count('task'))
+        if page_size is not None:
+            # One extra task per parent tells that there are more of them
+            tasks = tasks.annotate(
+                position=Window(RowNumber(), partition_by=F('parent_id'), order_by=F('id').asc())
+            ).filter(position__lte=page_size + 1)
+        return tasks.order_by('depth', 'id')
+
+    def tree(self, root=None, depth=None, page_size=None):
+        return TaskTree(self.tree_queryset(root, depth, page_size), root=root, page_size=page_size)
+
+    async def atree(self, root=None, depth=None, page_size=None):
+        tasks = [task async for task in self.tree_queryset(root, depth, page_size)]
+        return TaskTree(tasks, root=root, page_size=page_size)
+
+    def page_queryset(self, parent_id, after=None, page_size=None):
+        tasks = self.filter(parent_id=parent_id).annotate(subtask_count=Count('task')).order_by('id')
+        if after is not None:
+            tasks = tasks.filter(id__gt=after)
+        # One extra task tells that there are more of them
+        return tasks[:page_size + 1] if page_size is not None else tasks
+
+    def page(self, parent_id, after=None, page_size=None):
+        tasks = list(self.page_queryset(parent_id, after, page_size))
+        if page_size is None:
+            return tasks, False
+        return tasks[:page_size], len(tasks) > page_size
+
+    async def apage(self, parent_id, after=None, page_size=None):
+        tasks = [task async for task in self.page_queryset(parent_id, after, page_size)]
+        if page_size is None:
+            return tasks, False
+        return tasks[:page_size], len(tasks) > page_size
+
+    def open(self):
+        return self.exclude(status=Task.Status.COMPLETED)
+
+    def roots(self):
+        return self.filter(parent=None)
+
+    @contextlib.contextmanager
+    def deferred_rollups(self):
+        if deferred_rollup_ids.get() is not None:
+            yield
+            return
+
+        task_ids = set()
+        token = deferred_rollup_ids.set(task_ids)
+        try:
+            with transaction.atomic():
+                yield
+                deferred_rollup_ids.reset(token)
+                token = None
+                # Tasks may have been moved meanwhile, so their ancestors are taken from the paths they
+                # have now. The old ancestors of a moved task were recorded when it was saved.
+                task_ids = {
+                    ancestor_id
+                    for task_id, path in Task.objects.filter(id__in=task_ids).values_list('id', 'path')
+                    for ancestor_id in [task_id, *parse_path(path)]
+                }
+                if settings.TASKS_BACKGROUND_ROLLUPS:
+                    # Moved subtrees may carry totals that are still queued, so the ancestors are
+                    # recomputed by the worker after them rather than here
+                    RollupJob.objects.enqueue(task_ids)
+                else:
+                    Task.objects.filter(id__in=task_ids).recompute_subtree_totals()
+        finally:
+            if token is not None:
+                deferred_rollup_ids.reset(token)
+
+    def recompute_subtree_totals(self):
+        # Deepest tasks first, so every task is recomputed from subtasks that are already up to date
+        tasks = list(self.only('id', 'parent_id', 'depth', 'status', 'deadline', 'created_at',
+                               *Task.SUBTREE_TOTAL_FIELDS).order_by('-depth', 'id'))
+        for depth, level in itertools.groupby(tasks, key=lambda task: task.depth):
+            level = list(level)
+            subtasks = {
+                totals.pop('parent_id'): totals
+                for totals in Task.objects.filter(parent__in=level).order_by().values('parent_id')
+                                          .annotate(**{field: Sum(field) for field in Task.SUBTREE_TOTAL_FIELDS})
+            }
+
+            changed = []
+            for task in level:
+                totals = task.get_own_totals()
+                for field, total in subtasks.get(task.id, {}).items():
+                    totals[field] += total
+                if any(getattr(task, field) != total for field, total in totals.items()):
+                    for field, total in totals.items():
+                        setattr(task, field, total)
+                    changed.append(task)
+            if changed:
+                Task.objects.filter(id__in=[task.id for task in changed]).update_derived(**{
+                    field: Case(*[When(id=task.id, then=Value(getattr(task, field))) for task in changed],
+                                output_field=Task._meta.get_field(field))
+                    for field in Task.SUBTREE_TOTAL_FIELDS
+                })
+        return tasks
+
+    def with_stale_totals(self):
+        return self.annotate(stale_totals=Exists(RollupJob.objects.filter(task=OuterRef('pk'))))
+
+    def rollup(self, **deltas):
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        return self.update_derived(**{field: F(field) + delta for field, delta in deltas.items()})
+
 
 class Task(models.Model):
     class Status(models.TextChoices):
@@ -18,17 +281,89 @@ class Task(models.Model):
     description = models.TextField()
     performers = models.TextField()
     deadline = models.DateTimeField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     status = models.CharField(max_length=2, choices=Status.choices, default=Status.ASSIGNED, blank=True)
     planned_labor_intensity = models.DurationField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     actual_completion_time = models.DurationField(null=True, blank=True)
+    path = models.TextField(default='', blank=True, editable=False, db_index=True)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # Parsed from performers on every change of the text, which stays as it was entered
+    assignees = models.ManyToManyField('Performer', related_name='tasks', blank=True, editable=False)
+    # Tasks of the subtree, including the task itself, per status
+    assigned_count = models.PositiveIntegerField(default=0, editable=False)
+    in_progress_count = models.PositiveIntegerField(default=0, editable=False)
+    suspended_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
+
+    STATUS_COUNT_FIELDS = {
+        Status.ASSIGNED: 'assigned_count',
+        Status.IN_PROGRESS: 'in_progress_count',
+        Status.SUSPENDED: 'suspended_count',
+        Status.COMPLETED: 'completed_count',
+    }
+    SUBTREE_TOTAL_FIELDS = ['planned_labor_intensity', *STATUS_COUNT_FIELDS.values()]
+    # What the tree templates show of a task, subtrees are loaded without the rest
+    TREE_FIELDS = ['parent', 'depth', 'title', *STATUS_COUNT_FIELDS.values()]
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Open tasks by deadline, completed tasks are most of the table and never looked up this way
+            models.Index(fields=['deadline'], condition=~Q(status='CM'), name='task_open_deadline_idx'),
+            # Subtasks of a task by status, and their status counts straight from the index
+            models.Index(fields=['parent', 'status'], name='task_parent_status_idx'),
+            # Roots, and subtasks of a task, in the order they were created
+            models.Index(fields=['parent', 'created_at'], name='task_parent_created_at_idx'),
+            # Sort keys and filters of the task list
+            models.Index(fields=['deadline'], name='task_deadline_idx'),
+            models.Index(fields=['created_at'], name='task_created_at_idx'),
+            models.Index(fields=['status', 'deadline'], name='task_status_deadline_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        task = super().from_db(db, field_names, values)
+        task.remember_loaded_values()
+        return task
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        loaded_values = self.get_current_values()
+        if fields is not None:
+            attnames = {self._meta.get_field(field).attname for field in fields}
+            loaded_values = {attname: value for attname, value in loaded_values.items() if attname in attnames}
+        self._loaded_values = {**getattr(self, '_loaded_values', {}), **loaded_values}
+
+    def get_current_values(self):
+        # Deferred fields are left out, they can't have been changed without being loaded
+        return {field.attname: self.__dict__[field.attname]
+                for field in self._meta.concrete_fields if field.attname in self.__dict__}
+
+    def remember_loaded_values(self):
+        self._loaded_values = self.get_current_values()
+
+    def get_loaded_value(self, attname):
+        loaded_values = getattr(self, '_loaded_values', {})
+        if attname in loaded_values:
+            return loaded_values[attname]
+        return Task.objects.filter(id=self.id).values_list(attname, flat=True).get()
+
+    def get_changed_fields(self):
+        loaded_values = getattr(self, '_loaded_values', {})
+        return [attname for attname, value in self.get_current_values().items()
+                if attname not in loaded_values or value != loaded_values[attname]]
+
+    @property
+    def subtasks(self):
+        if not hasattr(self, '_subtasks'):
+            self._subtasks = list(self.task_set.all())
+        return self._subtasks
 
     def clean(self):
-        existing_task = None
-        try:
-            existing_task = Task.objects.get(id=self.id)
-        except Task.DoesNotExist:
+        if self._state.adding:
             if not self.status:
                 self.status = Task.Status.ASSIGNED
             if self.status in (Task.Status.IN_PROGRESS, Task.Status.SUSPENDED, Task.Status.COMPLETED):
@@ -36,61 +371,354 @@ class Task(models.Model):
                     {'status': f'The status "{self.get_status_display()}" cannot be set when creating a task. '
                                 'Only the status "Assigned" is available".'}
                 )
+            return
 
-        if self.status == Task.Status.COMPLETED and existing_task.status != Task.Status.IN_PROGRESS:
+        loaded_status = self.get_loaded_value('status')
+        if self.status == Task.Status.COMPLETED and loaded_status != Task.Status.IN_PROGRESS:
             raise ValidationError(
                 {'status': 'The status "Completed" can only be set after the status "In Progress".'}
             )
-        elif self.status == Task.Status.SUSPENDED and existing_task.status != Task.Status.IN_PROGRESS:
+        elif self.status == Task.Status.SUSPENDED and loaded_status != Task.Status.IN_PROGRESS:
             raise ValidationError(
                 {'status': 'The status "Suspended" can only be set after the status "In Progress".'}
             )
 
-    def save(self, clean=True):
+    @retry_when_locked
+    def save(self, clean=True, calculate_totals=None):
+        # Totals rolled up by another write between reading and writing them are calculated again.
+        # On SQLite with IMMEDIATE transactions writers are serialized, so that only happens on
+        # connections that take the write lock later, like the stock SQLite ones or other databases.
+        adding, loaded_values = self._state.adding, getattr(self, '_loaded_values', {})
+        values = self.get_current_values()
+        calculate_totals = clean if calculate_totals is None else calculate_totals
+        for attempt in range(settings.TASKS_SAVE_RETRIES + 1):
+            try:
+                with transaction.atomic():
+                    return self.save_changes(clean, calculate_totals)
+            except Exception as e:
+                # Nothing of the attempt was written, so the task is left as it was before it
+                self._state.adding = adding
+                self.__dict__.update(values)
+                self._loaded_values = loaded_values
+                if not isinstance(e, StaleTotals):
+                    raise
+        raise ConcurrentUpdateError()
+
+    def save_changes(self, clean, calculate_totals):
+        adding = self._state.adding
+        self.set_path()
+
         if clean:
             self.clean()
 
             if self.status == Task.Status.COMPLETED:
-                self.set_completed_status_recursively()
-
                 self.completed_at = timezone.now()
+
+                self.set_completed_status_recursively()
                 self.calculate_actual_completion_time()
 
-            self.calculate_planned_labor_intensity()
+        # In the same transaction as the write, so that every attempt starts from the stored totals
+        if calculate_totals:
+            self.calculate_subtree_totals()
+
+        # Derived fields are all set by now, so the row is written once, and only with what changed
+        if adding:
+            models.Model.save(self)
+        else:
+            update_fields = self.get_changed_fields()
+            if not update_fields:
+                return
+            loaded_values = getattr(self, '_loaded_values', {})
+            # The update only applies to the row as it was read, edits to the version it was loaded
+            # with, and totals to the ones they were calculated from
+            self._update_conditions = {
+                field: loaded_values[field] for field in update_fields
+                if field in Task.SUBTREE_TOTAL_FIELDS and field in loaded_values
+            }
+            if set(update_fields) - set(Task.SUBTREE_TOTAL_FIELDS):
+                if 'version' in loaded_values:
+                    self._update_conditions['version'] = loaded_values['version']
+                self.version += 1
+                update_fields.append('version')
+            try:
+                models.Model.save(self, update_fields=update_fields)
+            finally:
+                del self._update_conditions
+        bump_tree_version()
+
+        if adding or 'performers' in update_fields:
+            assign_performers([self], replace=not adding)
+        self.remember_loaded_values()
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        conditions = getattr(self, '_update_conditions', {})
+        if super()._do_update(base_qs.filter(**conditions), using, pk_val, values, update_fields, forced_update):
+            return True
+        if not conditions:
+            return False
+
+        version = Task.objects.filter(id=pk_val).values_list('version', flat=True).first()
+        if version is None or version != conditions.get('version', version):
+            raise ConcurrentUpdateError()
+        raise StaleTotals
+
+    @property
+    def subtree_size(self):
+        return sum(getattr(self, field) for field in Task.STATUS_COUNT_FIELDS.values())
+
+    @property
+    def descendant_count(self):
+        return max(self.subtree_size - 1, 0)
+
+    @property
+    def percent_complete(self):
+        return round(self.completed_count * 100 / self.subtree_size) if self.subtree_size else 0
+
+    def get_overdue_tasks(self):
+        # Being overdue depends on the current time, so unlike the other statistics it is counted on read
+        return Task.objects.open().filter(Q(id=self.id) | subtree_lookup(self.subtree_path),
+                                          deadline__lt=timezone.now())
+
+    def get_overdue_count(self):
+        return self.get_overdue_tasks().count()
+
+    async def aget_overdue_count(self):
+        return await self.get_overdue_tasks().acount()
+
+    @property
+    def subtree_path(self):
+        return f'{self.path}{self.id}/'
+
+    @property
+    def ancestor_ids(self):
+        return parse_path(self.path)
+
+    def get_ancestors(self):
+        return Task.objects.filter(id__in=self.ancestor_ids).order_by('depth')
+
+    def get_descendants(self):
+        return Task.objects.filter(subtree_lookup(self.subtree_path))
+
+    def set_path(self):
+        if self.ancestor_ids[-1:] == ([self.parent_id] if self.parent_id else []):
+            return
+
+        path = self.parent.subtree_path if self.parent else ''
+
+        depth = self.parent.depth + 1 if self.parent else 0
+        if self.id is not None:
+            if path.startswith(self.subtree_path):
+                raise ValidationError({'parent': 'A task cannot be moved into its own subtree.'})
+
+            self.get_descendants().update_derived(
+                path=Concat(Value(f'{path}{self.id}/'), Substr('path', len(self.subtree_path) + 1)),
+                depth=F('depth') + (depth - self.depth),
+            )
+
+        self.path = path
+        self.depth = depth
+
+    def detach_descendants(self, batch=False):
+        segments = self.subtree_path.split('/')[:-1]
+        if not batch:
+            # The descendants become roots, so the path up to this task is cut off in one range update
+            Task.objects.filter(subtree_lookup(self.subtree_path)).update_derived(
+                path=Substr('path', len(self.subtree_path) + 1),
+                depth=F('depth') - len(segments),
+            )
+            return
+
+        # Other tasks deleted in the same batch may have already cut off a part of the
+        # path, so match the descendants by every suffix of the path that ends with this task.
+        paths = [''.join(f'{segment}/' for segment in segments[i:]) for i in range(len(segments))]
 
-        models.Model.save(self)
+        descendants = Q()
+        for path in paths:
+            descendants |= subtree_lookup(path)
+        Task.objects.filter(descendants).update_derived(
+            path=Case(*[When(subtree_lookup(path), then=Substr('path', len(path) + 1)) for path in paths]),
+            depth=Case(*[When(subtree_lookup(path), then=F('depth') - (len(paths) - i)) for i, path in enumerate(paths)]),
+        )
+
+    @retry_when_locked
+    def delete(self, *args, **kwargs):
+        return super().delete(*args, **kwargs)
+
+    @retry_when_locked
+    def delete_subtree(self, chunk_size=500):
+        # Subtasks go deepest first, so none of them has subtasks left to detach, and every
+        # chunk is a short transaction of its own, so other writers are never blocked for long
+        with suspend_delete_receivers():
+            while True:
+                with transaction.atomic():
+                    subtask_ids = list(
+                        self.get_descendants().order_by('-depth').values_list('id', flat=True)[:chunk_size]
+                    )
+                    if not subtask_ids:
+                        break
+                    Task.objects.filter(id__in=subtask_ids).delete()
+
+            with transaction.atomic():
+                stored = Task.objects.filter(id=self.id).values(*Task.SUBTREE_TOTAL_FIELDS, 'path').get()
+                self.delete()
+                # The stored totals still include the whole subtree, so the ancestors are fixed up once
+                roll_up(parse_path(stored.pop('path')),
+                        **{field: -value for field, value in stored.items() if value is not None})
+                bump_tree_version()
 
     def set_completed_status_recursively(self):
-        with transaction.atomic():
-            try:
-                for subtask in self.task_set.all():
-                    subtask.status = Task.Status.COMPLETED
-                    subtask.save()
-                models.Model.save(self)
-            except ValidationError as e:
-                raise ValidationError(f'The subtask "{subtask.title}" cannot be completed. {e.messages[0]}')
+        subtasks = self.get_descendants().only('id', 'parent_id', 'title', 'status', 'created_at', 'depth').order_by('id')
+        tasks = {subtask.id: subtask for subtask in subtasks}
+        children = {}
+        for subtask in tasks.values():
+            children.setdefault(subtask.parent_id, []).append(subtask)
 
-    def calculate_planned_labor_intensity(self):
-        models.Model.save(self)
-        task = Task.objects.get(id=self.id)
-        planned_labor_intensity = task.deadline - task.created_at.replace(second=0, microsecond=0)
+        # Validate the whole subtree before writing anything, in the order the subtasks
+        # used to be saved one by one, so the first offending subtask is reported
+        stack = list(reversed(children.get(self.id, [])))
+        while stack:
+            subtask = stack.pop()
+            if subtask.status != Task.Status.IN_PROGRESS:
+                chain = [subtask]
+                while chain[-1].parent_id != self.id:
+                    chain.append(tasks[chain[-1].parent_id])
+                raise ValidationError(
+                    ''.join(f'The subtask "{task.title}" cannot be completed. ' for task in reversed(chain))
+                    + 'The status "Completed" can only be set after the status "In Progress".'
+                )
+            stack.extend(reversed(children.get(subtask.id, [])))
 
-        for subtask in self.task_set.all():
-            planned_labor_intensity += subtask.planned_labor_intensity
+        subtasks_actual_completion_time = {}
+        for subtask in sorted(tasks.values(), key=lambda task: task.depth, reverse=True):
+            subtask.actual_completion_time = (self.completed_at - subtask.created_at
+                                              + subtasks_actual_completion_time.get(subtask.id, datetime.timedelta(0)))
+            subtasks_actual_completion_time[subtask.parent_id] = (
+                subtasks_actual_completion_time.get(subtask.parent_id, datetime.timedelta(0))
+                + subtask.actual_completion_time
+            )
 
-        self.planned_labor_intensity = planned_labor_intensity
-        models.Model.save(self)
+        # Every subtask ends up completed, so only the completion times differ between rows
+        self.get_descendants().update(
+            status=Task.Status.COMPLETED,
+            completed_at=self.completed_at,
+            completed_count=F('assigned_count') + F('in_progress_count') + F('suspended_count') + F('completed_count'),
+            assigned_count=0,
+            in_progress_count=0,
+            suspended_count=0,
+        )
+        Task.objects.bulk_update(tasks.values(), ['actual_completion_time'])
 
-        if self.parent:
-            self.parent.calculate_planned_labor_intensity()
+    def get_own_planned_labor_intensity(self):
+        deadline_field = Task._meta.get_field('deadline')
+        deadline = deadline_field.get_prep_value(deadline_field.to_python(self.deadline))
+        return deadline - self.created_at.replace(second=0, microsecond=0)
 
-    def calculate_actual_completion_time(self):
-        actual_completion_time = self.completed_at - self.created_at
-        for subtask in self.task_set.all():
-            actual_completion_time += subtask.actual_completion_time
+    def get_own_totals(self):
+        totals = dict.fromkeys(Task.STATUS_COUNT_FIELDS.values(), 0)
+        totals[Task.STATUS_COUNT_FIELDS[self.status or Task.Status.ASSIGNED]] = 1
+        totals['planned_labor_intensity'] = self.get_own_planned_labor_intensity()
+        return totals
 
-        self.actual_completion_time = actual_completion_time
-        models.Model.save(self)
+    def calculate_subtree_totals(self):
+        # Only sets the totals of the task itself, which is left to be saved, and fixes up its ancestors
+        if self._state.adding:
+            for field, own_total in self.get_own_totals().items():
+                setattr(self, field, own_total)
+            roll_up(self.ancestor_ids, **{field: getattr(self, field) for field in Task.SUBTREE_TOTAL_FIELDS})
+            return
+
+        stored = Task.objects.filter(id=self.id).values(*Task.SUBTREE_TOTAL_FIELDS, 'path').get()
+        stored_path = stored.pop('path')
+        # Other writes may have rolled up into the row since it was loaded, the totals are compared with the stored ones
+        self._loaded_values = {**getattr(self, '_loaded_values', {}), **stored}
+        stored['planned_labor_intensity'] = stored['planned_labor_intensity'] or datetime.timedelta(0)
+        subtasks = self.task_set.aggregate(**{field: Sum(field) for field in Task.SUBTREE_TOTAL_FIELDS})
+
+        for field, own_total in self.get_own_totals().items():
+            setattr(self, field, own_total + subtasks[field] if subtasks[field] is not None else own_total)
+
+        # Ancestors already include the stored totals, so only the difference is pushed up
+        totals = {field: getattr(self, field) for field in Task.SUBTREE_TOTAL_FIELDS}
+        if stored_path == self.path:
+            roll_up(self.ancestor_ids, **{field: totals[field] - stored[field] for field in Task.SUBTREE_TOTAL_FIELDS})
+        else:
+            roll_up(parse_path(stored_path), **{field: -value for field, value in stored.items()})
+            roll_up(self.ancestor_ids, **totals)
+
+    def calculate_actual_completion_time(self):
+        subtasks_actual_completion_time = (
+            self.task_set.aggregate(total=Sum('actual_completion_time'))['total'] or datetime.timedelta(0)
+        )
+        self.actual_completion_time = self.completed_at - self.created_at + subtasks_actual_completion_time
 
     def get_absolute_url(self):
-        return reverse('task_detail', args=[self.id])
\ No newline at end of file
+        return reverse('task_detail', args=[self.id])
+
+    def get_json_url(self):
+        return reverse('task_json', args=[self.id])
+
+
+class PerformerQuerySet(models.QuerySet):
+    def for_names(self, names):
+        if not names:
+            return {}
+        performers = {performer.key: performer for performer in self.filter(key__in=names)}
+        missing = [Performer(key=key, name=name) for key, name in names.items() if key not in performers]
+        if missing:
+            # Another request may add the same performer meanwhile, the upsert returns its id all the same
+            self.bulk_create(missing, update_conflicts=True, unique_fields=['key'], update_fields=['key'])
+            performers.update((performer.key, performer) for performer in missing)
+        return performers
+
+    def autocomplete(self, text):
+        # A range of the unique key index, unlike LIKE, which SQLite can't serve from an index
+        key = performer_key(text)
+        return self.filter(key__gte=key, key__lt=key + '\U0010ffff').order_by('key')
+
+    def with_workload(self):
+        open_tasks = ~Q(tasks__status=Task.Status.COMPLETED)
+        return self.annotate(
+            task_count=Count('tasks'),
+            open_task_count=Count('tasks', filter=open_tasks),
+            planned_workload=Sum('tasks__planned_labor_intensity', filter=open_tasks),
+        )
+
+
+class Performer(models.Model):
+    name = models.TextField()
+    key = models.TextField(unique=True)
+
+    objects = PerformerQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+    def get_open_tasks(self):
+        return self.tasks.open().order_by('deadline', 'id')
+
+    def get_workload_url(self):
+        return reverse('performer_workload', args=[self.id])
+
+
+class RollupJobQuerySet(models.QuerySet):
+    def enqueue(self, task_ids):
+        # A task is queued once however many of its subtasks change, and a change made while
+        # it is being recomputed keeps it queued for the next batch
+        now = timezone.now()
+        self.bulk_create([RollupJob(task_id=task_id, enqueued_at=now, updated_at=now) for task_id in task_ids],
+                         update_conflicts=True, unique_fields=['task'], update_fields=['updated_at'])
+
+    def stats(self):
+        stats = self.aggregate(depth=Count('id'), oldest=Min('enqueued_at'))
+        return {
+            'depth': stats['depth'],
+            'lag': (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] is not None else 0,
+        }
+
+
+class RollupJob(models.Model):
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, related_name='rollup_job')
+    enqueued_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    objects = RollupJobQuerySet.as_manager()
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RollupJob, Task
+from .transactions import retry_when_locked
+
+
+@retry_when_locked
+def run_rollup_jobs(batch_size):
+    started_at = timezone.now()
+    with transaction.atomic():
+        task_ids = list(Task.objects.filter(rollup_job__isnull=False)
+                                    .order_by('-depth', 'id').values_list('id', flat=True)[:batch_size])
+        Task.objects.filter(id__in=task_ids).recompute_subtree_totals()
+
+        # Tasks queued again meanwhile stay queued, their subtasks may have changed after they were read
+        RollupJob.objects.filter(task__in=task_ids, updated_at__lte=started_at).delete()
+    return len(task_ids)
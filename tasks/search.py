@@ -0,0 +1,68 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+from .models import Task
+
+SEARCH_TABLE = 'tasks_task_fts'
+SEARCH_COLUMNS = ['title', 'description', 'performers']
+# bm25 weights in the order of SEARCH_COLUMNS, a match in the title ranks highest
+SEARCH_WEIGHTS = [10.0, 1.0, 5.0]
+
+# Control characters can't be typed into the forms, so they safely mark matches until the text is escaped
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_TOKENS = 12
+
+TERM_RE = re.compile(r'\w+')
+
+
+def match_query(text, prefix=True):
+    # Every word becomes a quoted string, so user input can never be parsed as FTS5 syntax.
+    # The last word is matched as a prefix while it is still being typed.
+    terms = [f'"{term}"' for term in TERM_RE.findall(text)]
+    if terms and prefix:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    return escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def search(text, limit, prefix=True):
+    query = match_query(text, prefix)
+    if not query:
+        return []
+
+    snippets = ', '.join(
+        f"snippet({SEARCH_TABLE}, {column}, %s, %s, '…', {SNIPPET_TOKENS}) AS {name}_snippet"
+        for column, name in enumerate(SEARCH_COLUMNS)
+    )
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    tasks = Task.objects.raw(
+        f'SELECT task.id, task.title, task.status, task.parent_id, bm25({SEARCH_TABLE}, {weights}) AS rank, '
+        f'{snippets} '
+        f'FROM {SEARCH_TABLE} JOIN tasks_task AS task ON task.id = {SEARCH_TABLE}.rowid '
+        f'WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank LIMIT %s',
+        [MATCH_START, MATCH_END] * len(SEARCH_COLUMNS) + [query, limit],
+    )
+
+    tasks = list(tasks)
+    for task in tasks:
+        for name in SEARCH_COLUMNS:
+            setattr(task, f'{name}_snippet', highlight(getattr(task, f'{name}_snippet')))
+    return tasks
+
+
+def rebuild_index(optimize=True):
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+        if optimize:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def check_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('integrity-check', 1)")
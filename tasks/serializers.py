@@ -0,0 +1,116 @@
+from django.urls import reverse
+from django.utils import timezone
+
+from .templatetags.tasks_tags import duration, time_format
+
+
+def format_datetime(value):
+    return time_format(timezone.localtime(value)) if value is not None else None
+
+
+def serialize_duration(value):
+    return value.total_seconds() if value is not None else None
+
+
+def serialize_datetime(value):
+    return value.isoformat() if value is not None else None
+
+
+def serialize_stats(task):
+    return {
+        'descendant_count': task.descendant_count,
+        'subtree_size': task.subtree_size,
+        'percent_complete': task.percent_complete,
+        **{field: getattr(task, field) for field in task.STATUS_COUNT_FIELDS.values()},
+    }
+
+
+def serialize_subtask(task):
+    return {
+        'id': task.id,
+        'title': task.title,
+        'status': task.status,
+        'subtask_count': task.subtask_count,
+        'stats': serialize_stats(task),
+        'url': task.get_absolute_url(),
+        'json_url': task.get_json_url(),
+        'subtasks_url': reverse('subtasks', args=[task.id]),
+    }
+
+
+def serialize_search_result(task):
+    return {
+        'id': task.id,
+        'parent_id': task.parent_id,
+        'title': task.title,
+        'status': task.status,
+        'rank': task.rank,
+        'snippets': {
+            'title': task.title_snippet,
+            'description': task.description_snippet,
+            'performers': task.performers_snippet,
+        },
+        'url': task.get_absolute_url(),
+        'json_url': task.get_json_url(),
+    }
+
+
+def serialize_performer(performer):
+    return {
+        'id': performer.id,
+        'name': performer.name,
+        'task_count': performer.task_count,
+        'open_task_count': performer.open_task_count,
+        'planned_workload': serialize_duration(performer.planned_workload),
+        'workload_url': performer.get_workload_url(),
+    }
+
+
+def serialize_workload(performer, open_tasks):
+    return {
+        **serialize_performer(performer),
+        'display': {'planned_workload': duration(performer.planned_workload)},
+        'open_tasks': [
+            {
+                'id': task.id,
+                'title': task.title,
+                'status': task.status,
+                'deadline': serialize_datetime(task.deadline),
+                'planned_labor_intensity': serialize_duration(task.planned_labor_intensity),
+                'url': task.get_absolute_url(),
+            }
+            for task in open_tasks
+        ],
+    }
+
+
+def serialize_task(task, subtasks, overdue_count):
+    return {
+        'id': task.id,
+        'parent_id': task.parent_id,
+        'version': task.version,
+        'title': task.title,
+        'description': task.description,
+        'performers': task.performers,
+        'status': task.status,
+        'status_display': task.get_status_display(),
+        'deadline': serialize_datetime(task.deadline),
+        'created_at': serialize_datetime(task.created_at),
+        'completed_at': serialize_datetime(task.completed_at),
+        'planned_labor_intensity': serialize_duration(task.planned_labor_intensity),
+        'actual_completion_time': serialize_duration(task.actual_completion_time),
+        'stats': {**serialize_stats(task), 'overdue_count': overdue_count, 'stale': task.stale_totals},
+        'display': {
+            'deadline': format_datetime(task.deadline),
+            'created_at': format_datetime(task.created_at),
+            'completed_at': format_datetime(task.completed_at),
+            'planned_labor_intensity': duration(task.planned_labor_intensity),
+            'actual_completion_time': duration(task.actual_completion_time),
+        },
+        'urls': {
+            'detail': task.get_absolute_url(),
+            'delete': reverse('delete_task', args=[task.id]),
+            'new_subtask': reverse('new_subtask', args=[task.id]),
+        },
+        'subtasks': [serialize_subtask(subtask) for subtask in subtasks],
+    }
@@ -1,8 +1,30 @@
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
-from .models import Task
+from .cache import bump_tree_version
+from .models import Task, deferred_rollup_ids, delete_receivers_suspended
 
 @receiver(post_delete, sender=Task)
-def calculate_planned_labor_intensity(sender, instance, **kwargs):
-    if instance.parent:
-        instance.parent.calculate_planned_labor_intensity()
+def calculate_subtree_totals(sender, instance, **kwargs):
+    if delete_receivers_suspended.get():
+        return
+    if instance.parent_id is None:
+        return
+    if deferred_rollup_ids.get() is not None:
+        deferred_rollup_ids.get().add(instance.parent_id)
+        return
+    instance.parent.save(clean=False, calculate_totals=True)
+
+
+@receiver(post_delete, sender=Task)
+def detach_subtasks(sender, instance, origin=None, **kwargs):
+    if delete_receivers_suspended.get():
+        return
+    # A queryset delete may remove ancestors of the task in the same batch
+    instance.detach_descendants(batch=not isinstance(origin, Task))
+
+
+@receiver(post_delete, sender=Task)
+def invalidate_sidebar(sender, instance, **kwargs):
+    if delete_receivers_suspended.get():
+        return
+    bump_tree_version()
@@ -1,24 +1,201 @@
 taskDetailContainer = document.querySelector('#task-detail-container');
 document.querySelectorAll("textarea").forEach(autoGrow);
 
+const searchInput = document.querySelector('#search-tasks');
+const searchResults = document.querySelector('#search-results');
+let searchTimeout = null;
+let searchController = null;
+searchInput.addEventListener('input', () => {
+    clearTimeout(searchTimeout);
+    searchTimeout = setTimeout(searchTasks, 150);
+});
+
 function getTaskDetail(tasksListItem) {
-    const url = tasksListItem.dataset.url;
     var options = {
         method: 'GET',
         headers: {
-            "X-Requested-With": "XMLHttpRequest",
+            "Accept": "application/json",
         }
     }
 
-    fetch(url, options)
+    // The browser revalidates the cached detail with its ETag and gets 304 while the task is unchanged
+    fetch(tasksListItem.dataset.jsonUrl, options)
     .then(response => response.json())
-    .then(data => {
-        taskDetailContainer.innerHTML = data['form'];
-        window.history.replaceState(null, document.title, data['url']);
+    .then(task => {
+        renderTaskDetail(task);
+        window.history.replaceState(null, document.title, task.urls.detail);
         document.querySelectorAll("textarea").forEach(autoGrow);
     });
 }
 
+function renderTaskDetail(task) {
+    const taskDetail = document.querySelector('#task-detail-template').content.cloneNode(true);
+
+    const form = taskDetail.querySelector('#task-detail');
+    form.action = task.urls.detail;
+    form.querySelector('#id_version').value = task.version;
+    form.querySelector('#id_title').value = task.title;
+    form.querySelector('#id_description').value = task.description;
+    form.querySelector('#id_performers').value = task.performers;
+    form.querySelector('#id_deadline').value = task.display.deadline;
+    form.querySelector('#id_status').value = task.status;
+    form.querySelector('#id_planned_labor_intensity').textContent = task.display.planned_labor_intensity;
+    form.querySelector('#id_created_at').textContent = task.display.created_at;
+    form.querySelector('#id_progress').textContent =
+        `${task.stats.percent_complete}% (${task.stats.completed_count} of ${task.stats.subtree_size} tasks completed)`;
+    form.querySelector('#id_subtree_stats').textContent =
+        `${task.stats.descendant_count}: ${task.stats.assigned_count} assigned, ` +
+        `${task.stats.in_progress_count} in progress, ${task.stats.suspended_count} suspended, ` +
+        `${task.stats.completed_count} completed, ${task.stats.overdue_count} overdue`;
+    if (!task.stats.stale) {
+        form.querySelector('#id_stale_totals').remove();
+    }
+    if (task.completed_at) {
+        form.querySelector('#id_completed_at').textContent = task.display.completed_at;
+        form.querySelector('#id_actual_completion_time').textContent = task.display.actual_completion_time;
+    } else {
+        form.querySelectorAll('.completed').forEach(element => element.remove());
+    }
+
+    taskDetail.querySelector('#delete-task').action = task.urls.delete;
+    taskDetail.querySelector('#add-subtask').action = task.urls.new_subtask;
+
+    const subtasksList = taskDetail.querySelector('#subtasks-list');
+    task.subtasks.forEach(subtask => subtasksList.append(renderSubtask(subtask)));
+    if (!task.subtasks.length) {
+        taskDetail.querySelector('#subtasks').replaceChildren();
+    }
+
+    taskDetailContainer.replaceChildren(taskDetail);
+}
+
+function renderSubtask(subtask) {
+    const item = document.createElement('li');
+
+    if (subtask.stats.descendant_count) {
+        const badge = document.createElement('span');
+        badge.className = 'progress-badge';
+        badge.title = `${subtask.stats.completed_count} of ${subtask.stats.subtree_size} tasks completed`;
+        badge.textContent = `${subtask.stats.percent_complete}%`;
+        item.append(badge);
+    }
+
+    const title = document.createElement('div');
+    title.className = 'task-title';
+    title.dataset.url = subtask.url;
+    title.dataset.jsonUrl = subtask.json_url;
+    title.onclick = () => getTaskDetail(title);
+    const titleText = document.createElement('span');
+    titleText.textContent = subtask.title;
+    title.append(titleText);
+    item.append(title);
+
+    if (subtask.subtask_count) {
+        const nested = document.createElement('ul');
+        nested.className = 'nested';
+        const loadSubtasksItem = document.createElement('li');
+        loadSubtasksItem.className = 'load-subtasks';
+        const button = document.createElement('button');
+        button.type = 'button';
+        button.dataset.url = subtask.subtasks_url;
+        button.textContent = `Show subtasks (${subtask.subtask_count})`;
+        button.onclick = () => loadSubtasks(button);
+        loadSubtasksItem.append(button);
+        nested.append(loadSubtasksItem);
+        item.append(nested);
+    }
+
+    return item;
+}
+
+function loadSubtasks(button) {
+    var options = {
+        method: 'GET',
+        headers: {
+            "X-Requested-With": "XMLHttpRequest",
+        }
+    }
+
+    button.disabled = true;
+    fetch(button.dataset.url, options)
+    .then(response => response.text())
+    .then(html => {
+        button.parentElement.outerHTML = html;
+    });
+}
+
+const performerSuggestions = document.querySelector('#performer-suggestions');
+let performersTimeout = null;
+document.addEventListener('input', event => {
+    if (event.target.id === 'id_performers') {
+        clearTimeout(performersTimeout);
+        performersTimeout = setTimeout(() => suggestPerformers(event.target), 150);
+    }
+});
+
+function suggestPerformers(input) {
+    // Only the name after the last separator is completed, the names before it are kept
+    const names = input.value.split(/[,;]/);
+    const query = names.pop().trim();
+    if (!query) {
+        performerSuggestions.replaceChildren();
+        return;
+    }
+
+    const prefix = names.map(name => name.trim() + ', ').join('');
+    fetch(`${performerSuggestions.dataset.url}?q=${encodeURIComponent(query)}`, {headers: {"Accept": "application/json"}})
+    .then(response => response.json())
+    .then(data => performerSuggestions.replaceChildren(...data.results.map(performer => {
+        const option = document.createElement('option');
+        option.value = prefix + performer.name;
+        option.label = `${performer.open_task_count} open tasks`;
+        return option;
+    })));
+}
+
+function searchTasks() {
+    // A newer query makes the response to the previous one useless
+    if (searchController) {
+        searchController.abort();
+    }
+    const query = searchInput.value.trim();
+    if (!query) {
+        searchResults.replaceChildren();
+        return;
+    }
+
+    searchController = new AbortController();
+    const url = `${searchInput.dataset.url}?q=${encodeURIComponent(query)}`;
+    fetch(url, {headers: {"Accept": "application/json"}, signal: searchController.signal})
+    .then(response => response.json())
+    .then(data => searchResults.replaceChildren(...data.results.map(renderSearchResult)))
+    .catch(error => {
+        if (error.name !== 'AbortError') {
+            throw error;
+        }
+    });
+}
+
+function renderSearchResult(task) {
+    // Snippets are escaped by the server, only the <mark> tags around matches are markup
+    const item = document.createElement('li');
+    item.dataset.jsonUrl = task.json_url;
+    item.onclick = () => getTaskDetail(item);
+
+    const title = document.createElement('div');
+    title.innerHTML = task.snippets.title;
+    item.append(title);
+
+    const snippet = task.snippets.description.includes('<mark>') ? task.snippets.description : task.snippets.performers;
+    if (snippet.includes('<mark>')) {
+        const details = document.createElement('div');
+        details.className = 'snippet';
+        details.innerHTML = snippet;
+        item.append(details);
+    }
+    return item;
+}
+
 function autoGrow(element) {
     element.style.height = "auto";
     element.style.height = (element.scrollHeight-20)+"px";
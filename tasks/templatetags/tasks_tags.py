@@ -1,17 +1,31 @@
 from datetime import timezone, timedelta
 
 from django import template
-from tasks.models import Task
+
+from tasks.cache import get_sidebar
 
 register = template.Library()
 
-@register.simple_tag
-def get_tasks():
-    return Task.objects.filter(parent__isnull=True)
+
+class CachedSidebarNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        return get_sidebar(lambda: self.nodelist.render(context))
+
+
+@register.tag
+def cached_sidebar(parser, token):
+    nodelist = parser.parse(('endcached_sidebar',))
+    parser.delete_first_token()
+    return CachedSidebarNode(nodelist)
 
 
 @register.filter
 def duration(timedelta):
+    if timedelta is None:
+        return ''
     days = timedelta.days
     seconds = timedelta.seconds
     hours, seconds = divmod(seconds, 3600)
@@ -1,8 +1,13 @@
-from django.test import TestCase
+import re
+
+from django.test import TestCase, override_settings
 from tasks.models import Task
 from tasks.forms import TaskForm
 
 
+# Tree version bumps run on commit, which never happens inside a TestCase
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+                   TASKS_QUERY_BUDGETS_STRICT=True)
 class UnitTest(TestCase):
     VALID_TASK_DATA = {
         'title': 'Buy tea',
@@ -39,4 +44,20 @@ class UnitTest(TestCase):
                               'description': description,
                               'performers': performers,
                               'deadline': deadline,
-                              'status': status})
\ No newline at end of file
+                              'status': status})
+
+    def assertUsesIndexes(self, queryset, ordered=False):
+        # Searching or scanning an index is fine, a bare SCAN reads the whole table
+        plan = queryset.explain()
+        table_scans = re.findall(r'SCAN \w+(?: AS \w+)?$', plan, re.MULTILINE)
+        self.assertFalse(table_scans, f'The query scans whole tables:\n{plan}')
+        if ordered:
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f'The query sorts its rows:\n{plan}')
+
+    def create_task_chain(self, parent, length):
+        tasks = []
+        for i in range(length):
+            parent = self.create_task(title=f'Subtask {i}', parent=parent)
+            parent.save()
+            tasks.append(parent)
+        return tasks
@@ -0,0 +1,255 @@
+import datetime
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from tasks.models import Performer, RollupJob, Task
+from tasks.search import search
+from .base import UnitTest
+
+
+class ImportTasksCommandTest(UnitTest):
+    CSV_HEADER = 'id,parent,title,description,performers,deadline,status,created_at,completed_at\n'
+
+    def import_tasks(self, content, suffix='.csv', *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix) as file:
+            file.write(content)
+            file.flush()
+            stdout = StringIO()
+            call_command('import_tasks', file.name, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_imports_tasks_with_paths(self):
+        output = self.import_tasks(
+            self.CSV_HEADER
+            + '1,,Brew the tea,Brew puer,Vlad,2024-10-03 13:00,,2024-10-01 10:00,\n'
+            + '2,1,Heat water,Heat to 94C,Vlad,2024-10-03 12:00,,2024-10-01 11:00,\n'
+            + '3,2,Fill the kettle,With 500ml,Vlad,2024-10-02 12:00,,2024-10-01 11:30,\n'
+        )
+
+        self.assertIn('Imported 3 tasks', output)
+        self.assertIn('rows/s', output)
+        task, subtask, subsubtask = Task.objects.order_by('depth')
+        self.assertEqual(subtask.parent, task)
+        self.assertEqual(subsubtask.parent, subtask)
+        self.assertEqual(subsubtask.path, f'{task.id}/{subtask.id}/')
+        self.assertEqual(subsubtask.depth, 2)
+        self.assertEqual(task.status, Task.Status.ASSIGNED)
+
+    def test_assigns_performers(self):
+        self.create_task(performers='Anna').save()
+
+        self.import_tasks(
+            self.CSV_HEADER
+            + '1,,Brew the tea,Brew puer,"Vlad, anna",2024-10-03 13:00,,2024-10-01 10:00,\n'
+            + '2,1,Heat water,Heat to 94C,Vlad,2024-10-03 12:00,,2024-10-01 11:00,\n'
+        )
+
+        self.assertEqual(Performer.objects.count(), 2)
+        task = Task.objects.get(title='Brew the tea')
+        self.assertEqual(sorted(task.assignees.values_list('name', flat=True)), ['Anna', 'Vlad'])
+        self.assertEqual(Performer.objects.get(name='Vlad').tasks.count(), 2)
+
+    def test_rolls_up_planned_labor_intensity(self):
+        self.import_tasks(
+            self.CSV_HEADER
+            + '1,,Brew the tea,Brew puer,Vlad,2024-10-03 13:00,,2024-10-01 10:00,\n'
+            + '2,1,Heat water,Heat to 94C,Vlad,2024-10-03 12:00,,2024-10-01 11:00,\n'
+            + '3,2,Fill the kettle,With 500ml,Vlad,2024-10-02 12:00,,2024-10-01 11:30,\n'
+            + '4,1,Steep the tea,For 5 minutes,Vlad,2024-10-04 13:00,,2024-10-01 12:00,\n'
+        )
+
+        task = Task.objects.get(title='Brew the tea')
+        subtask = Task.objects.get(title='Heat water')
+        self.assertEqual(subtask.planned_labor_intensity, datetime.timedelta(days=3, hours=1, minutes=30))
+        self.assertEqual(task.planned_labor_intensity, datetime.timedelta(days=8, hours=5, minutes=30))
+
+    def test_imports_ndjson(self):
+        rows = [
+            {'id': 10, 'title': 'Brew the tea', 'description': 'Brew puer', 'performers': 'Vlad',
+             'deadline': '2024-10-03T13:00:00+00:00', 'status': 'PR', 'created_at': '2024-10-01T10:00:00+00:00'},
+            {'id': 20, 'parent': 10, 'title': 'Heat water', 'description': 'Heat to 94C', 'performers': 'Vlad',
+             'deadline': '2024-10-03T12:00:00+00:00', 'status': 'CM', 'created_at': '2024-10-01T11:00:00+00:00',
+             'completed_at': '2024-10-01T12:00:00+00:00'},
+        ]
+        self.import_tasks(''.join(json.dumps(row) + '\n' for row in rows), '.ndjson')
+
+        task = Task.objects.get(title='Brew the tea')
+        subtask = Task.objects.get(title='Heat water')
+        self.assertEqual(task.status, Task.Status.IN_PROGRESS)
+        self.assertIsNone(task.actual_completion_time)
+        self.assertEqual(subtask.actual_completion_time, datetime.timedelta(hours=1))
+        self.assertEqual(subtask.created_at, datetime.datetime(2024, 10, 1, 11, tzinfo=datetime.timezone.utc))
+
+    def test_completed_task_completes_subtasks_in_progress(self):
+        self.import_tasks(
+            self.CSV_HEADER
+            + '1,,Brew the tea,Brew puer,Vlad,2024-10-03 13:00,CM,2024-10-01 10:00,2024-10-01 14:00\n'
+            + '2,1,Heat water,Heat to 94C,Vlad,2024-10-03 12:00,PR,2024-10-01 11:00,\n'
+        )
+
+        task = Task.objects.get(title='Brew the tea')
+        subtask = Task.objects.get(title='Heat water')
+        self.assertEqual(subtask.status, Task.Status.COMPLETED)
+        self.assertEqual(subtask.completed_at, task.completed_at)
+        self.assertEqual(task.completed_count, 2)
+        self.assertEqual(subtask.actual_completion_time, datetime.timedelta(hours=3))
+        self.assertEqual(task.actual_completion_time, datetime.timedelta(hours=7))
+
+    def test_cannot_complete_assigned_subtasks(self):
+        with self.assertRaisesMessage(CommandError, 'Row 2: the subtask "Heat water" cannot be completed.'):
+            self.import_tasks(
+                self.CSV_HEADER
+                + '1,,Brew the tea,Brew puer,Vlad,2024-10-03 13:00,CM,2024-10-01 10:00,2024-10-01 14:00\n'
+                + '2,1,Heat water,Heat to 94C,Vlad,2024-10-03 12:00,AS,2024-10-01 11:00,\n'
+            )
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_reports_invalid_rows(self):
+        with self.assertRaisesMessage(CommandError, 'Row 1:'):
+            self.import_tasks(self.CSV_HEADER + '1,,,Brew puer,Vlad,2024-10-03 13:00,,,\n')
+        with self.assertRaisesMessage(CommandError, 'Row 1:'):
+            self.import_tasks(self.CSV_HEADER + '1,,Brew the tea,Brew puer,Vlad,tomorrow,,,\n')
+        with self.assertRaisesMessage(CommandError, 'Row 2: the parent task 3 must come before its subtasks.'):
+            self.import_tasks(
+                self.CSV_HEADER
+                + '1,,Brew the tea,Brew puer,Vlad,2024-10-03 13:00,,,\n'
+                + '2,3,Heat water,Heat to 94C,Vlad,2024-10-03 12:00,,,\n'
+            )
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_imports_under_existing_task(self):
+        task = self.create_task()
+        task.save()
+        subtask = self.create_task(parent=task)
+        subtask.save()
+        planned_labor_intensity = Task.objects.get(id=task.id).planned_labor_intensity
+
+        self.import_tasks(
+            self.CSV_HEADER
+            + '1,,Heat water,Heat to 94C,Vlad,2024-10-03 12:00,,2024-10-01 11:00,\n',
+            '.csv', '--parent', str(subtask.id)
+        )
+
+        imported_task = Task.objects.get(title='Heat water')
+        self.assertEqual(imported_task.parent, subtask)
+        self.assertEqual(imported_task.path, f'{task.id}/{subtask.id}/')
+        task = Task.objects.get(id=task.id)
+        self.assertEqual(task.planned_labor_intensity, planned_labor_intensity + imported_task.planned_labor_intensity)
+        self.assertEqual(task.descendant_count, 2)
+
+    def test_number_of_queries_does_not_depend_on_number_of_rows(self):
+        def rows(count):
+            return self.CSV_HEADER + ''.join(
+                f'{i},{i - 1 if i % 10 != 1 else ""},Task {i},Description,Vlad,2024-10-03 13:00,,,\n'
+                for i in range(1, count + 1)
+            )
+
+        with self.assertNumQueries(9):
+            self.import_tasks(rows(10), '.csv', '--batch-size', '100')
+        # The performer was added by the first import
+        with self.assertNumQueries(8):
+            self.import_tasks(rows(50), '.csv', '--batch-size', '100')
+
+    def test_number_of_queries_does_not_depend_on_depth(self):
+        def rows(chain_length):
+            return self.CSV_HEADER + ''.join(
+                f'{i},{i - 1 if i % chain_length != 1 else ""},Task {i},Description,Vlad,2024-10-03 13:00,,,\n'
+                for i in range(1, 91)
+            )
+
+        self.import_tasks(rows(2), '.csv', '--batch-size', '100')
+        with CaptureQueriesContext(connection) as shallow_queries:
+            self.import_tasks(rows(2), '.csv', '--batch-size', '100')
+        with CaptureQueriesContext(connection) as deep_queries:
+            self.import_tasks(rows(90), '.csv', '--batch-size', '100')
+
+        self.assertEqual(len(deep_queries), len(shallow_queries))
+        root = Task.objects.filter(parent=None).order_by('id').last()
+        self.assertEqual(root.subtree_size, 90)
+        self.assertEqual(Task.objects.get(parent=root).subtree_size, 89)
+
+
+class ExportTasksCommandTest(UnitTest):
+    def test_exports_tasks_to_stdout(self):
+        task = self.create_task()
+        task.save()
+        subtask = self.create_task(title='Heat water', parent=task)
+        subtask.save()
+
+        stdout = StringIO()
+        call_command('export_tasks', '--format', 'ndjson', stdout=stdout)
+
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([(row['id'], row['parent']) for row in rows], [(task.id, None), (subtask.id, task.id)])
+
+    def test_exported_file_can_be_imported(self):
+        task = self.create_task()
+        task.save()
+        self.create_task_chain(parent=task, length=3)
+        exported = list(Task.objects.order_by('id').values_list('title', 'depth', 'planned_labor_intensity'))
+        max_id = Task.objects.order_by('id').last().id
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as file:
+            call_command('export_tasks', '--task', str(task.id), '--output', file.name)
+            call_command('import_tasks', file.name, stdout=StringIO())
+
+        imported = Task.objects.filter(id__gt=max_id).order_by('id')
+        self.assertEqual(list(imported.values_list('title', 'depth', 'planned_labor_intensity')), exported)
+
+    def test_exported_subtree_can_be_imported(self):
+        task = self.create_task()
+        task.save()
+        subtask, *subtasks = self.create_task_chain(parent=task, length=3)
+        exported = list(Task.objects.filter(id__gte=subtask.id).order_by('id')
+                                    .values_list('title', 'planned_labor_intensity'))
+        max_id = Task.objects.order_by('id').last().id
+
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as file:
+            call_command('export_tasks', '--task', str(subtask.id), '--format', 'ndjson', '--output', file.name)
+            call_command('import_tasks', file.name, stdout=StringIO())
+
+        imported = Task.objects.filter(id__gt=max_id).order_by('id')
+        self.assertEqual(list(imported.values_list('title', 'planned_labor_intensity')), exported)
+        self.assertEqual(list(imported.values_list('depth', flat=True)), [0, 1, 2])
+        self.assertIsNone(imported.first().parent_id)
+
+
+class RebuildSearchIndexCommandTest(UnitTest):
+    def test_rebuilds_index(self):
+        task = self.create_task(title='Buy puer')
+        task.save()
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO tasks_task_fts(tasks_task_fts) VALUES ('delete-all')")
+        self.assertEqual(search('puer', 10), [])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', '--check', stdout=StringIO())
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(search('puer', 10), [task])
+        stdout = StringIO()
+        call_command('rebuild_search_index', '--check', stdout=stdout)
+        self.assertIn('in sync', stdout.getvalue())
+
+
+class RunRollupWorkerCommandTest(UnitTest):
+    @override_settings(TASKS_BACKGROUND_ROLLUPS=True)
+    def test_drains_queue(self):
+        task = self.create_task()
+        task.save()
+        subtask, leaf = self.create_task_chain(parent=task, length=2)
+        self.assertEqual(RollupJob.objects.count(), 2)
+
+        output = StringIO()
+        call_command('run_rollup_worker', '--once', '--batch-size', '1', verbosity=2, stdout=output)
+
+        self.assertFalse(RollupJob.objects.exists())
+        self.assertEqual(Task.objects.get(id=task.id).assigned_count, 3)
+        self.assertIn('Recomputed 1 tasks', output.getvalue())
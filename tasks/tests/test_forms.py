@@ -67,3 +67,15 @@ class TaskFormTest(UnitTest):
         form = self.create_task_form_with_data(status='any')
         self.assertFalse(form.is_valid())
         self.assertIn('status', form.errors)
+
+    def test_rejects_task_changed_after_rendering(self):
+        task = TaskForm(data=UnitTest.VALID_TASK_DATA).save()
+        rendered_version = TaskForm(instance=task)['version'].value()
+        task.title = 'Changed meanwhile'
+        task.save()
+
+        form = TaskForm(instance=Task.objects.get(id=task.id),
+                        data={**UnitTest.VALID_TASK_DATA, 'version': rendered_version})
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('changed by someone else', form.non_field_errors()[0])
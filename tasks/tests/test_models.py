@@ -1,11 +1,23 @@
 import datetime
+import importlib
+import re
+import threading
 import zoneinfo
 from datetime import tzinfo
+from unittest import mock
 
+from django.apps import apps
 from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, F, Q
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from tasks.models import Task
+from tasks.models import ConcurrentUpdateError, Performer, RollupJob, Task, parse_performers, subtree_lookup
+from tasks.rollups import run_rollup_jobs
+from tasks.search import match_query, search
+from tasks.transactions import retry_when_locked
 from .base import UnitTest
 
 
@@ -325,3 +337,1145 @@ class TaskModelTest(UnitTest):
              f'The status "Completed" can only be set after the status "In Progress".',
             context.exception.message
         )
+
+
+class TaskTreeTest(UnitTest):
+    def create_subtasks(self, parent, count):
+        subtasks = []
+        for i in range(count):
+            subtask = self.create_task(title=f'{parent.title}.{i}', parent=parent)
+            subtask.save()
+            subtasks.append(subtask)
+        return subtasks
+
+    def test_links_tasks_into_tree(self):
+        task = self.create_task(title='1')
+        task.save()
+        subtask_1, subtask_2 = self.create_subtasks(task, 2)
+        subsubtask, = self.create_subtasks(subtask_2, 1)
+        other_task = self.create_task(title='2')
+        other_task.save()
+
+        tree = Task.objects.tree()
+
+        self.assertEqual(list(tree), [task, other_task])
+        self.assertEqual(tree[task.id].subtasks, [subtask_1, subtask_2])
+        self.assertEqual(tree[subtask_2.id].subtasks, [subsubtask])
+        self.assertEqual(tree[subsubtask.id].subtasks, [])
+
+    def test_loads_tree_in_one_query(self):
+        task = self.create_task(title='1')
+        task.save()
+        for subtask in self.create_subtasks(task, 3):
+            self.create_subtasks(subtask, 3)
+
+        with self.assertNumQueries(1):
+            tree = Task.objects.tree()
+            titles = [subtask.title for root in tree for subtask in root.subtasks]
+            titles += [subtask.title for node in tree[task.id].subtasks for subtask in node.subtasks]
+        self.assertEqual(len(titles), 12)
+
+    def test_loads_only_fields_shown_in_tree(self):
+        task = self.create_task(title='1', description='Long description', performers='Alice')
+        task.save()
+        subtask, = self.create_subtasks(task, 1)
+
+        with self.assertNumQueries(1):
+            tree = Task.objects.tree(root=task)
+            node = tree[subtask.id]
+            self.assertEqual(node.title, '1.0')
+            self.assertEqual(node.parent_id, task.id)
+            self.assertEqual((node.subtree_size, node.percent_complete), (1, 0))
+        self.assertIn('description', node.get_deferred_fields())
+        self.assertIn('performers', node.get_deferred_fields())
+
+    def test_loads_only_subtree_of_root(self):
+        task = self.create_task(title='1')
+        task.save()
+        subtask, = self.create_subtasks(task, 1)
+        subsubtask, = self.create_subtasks(subtask, 1)
+        other_task = self.create_task(title='2')
+        other_task.save()
+        self.create_subtasks(other_task, 2)
+
+        with self.assertNumQueries(1):
+            tree = Task.objects.tree(root=subtask)
+            self.assertEqual(list(tree), [subtask])
+            self.assertEqual(subtask.subtasks, [subsubtask])
+            self.assertEqual(tree[subsubtask.id].subtasks, [])
+        self.assertEqual(len(tree.nodes), 2)
+
+    def test_loads_limited_number_of_levels(self):
+        task = self.create_task(title='1')
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+        self.create_subtasks(subsubtask, 3)
+
+        tree = Task.objects.tree(depth=2)
+
+        self.assertEqual(set(tree.nodes), {task.id, subtask.id})
+        self.assertEqual(tree[subtask.id].subtasks, [])
+        self.assertEqual(tree[subtask.id].subtask_count, 1)
+
+        tree = Task.objects.tree(root=subtask, depth=1)
+        self.assertEqual(set(tree.nodes), {subtask.id, subsubtask.id})
+        self.assertEqual(tree[subsubtask.id].subtask_count, 3)
+
+    def test_loads_limited_number_of_subtasks_per_task(self):
+        task = self.create_task(title='1')
+        task.save()
+        subtasks = self.create_subtasks(task, 5)
+        self.create_subtasks(subtasks[-1], 1)
+        for i in range(3):
+            self.create_task(title=f'{i + 2}').save()
+
+        tree = Task.objects.tree(page_size=2)
+
+        self.assertEqual(len(tree.roots), 2)
+        self.assertTrue(tree.has_more)
+        self.assertEqual(tree[task.id].subtasks, subtasks[:2])
+        self.assertTrue(tree[task.id].has_more_subtasks)
+        self.assertEqual(len(tree.nodes), 4)
+
+    def test_gets_page_of_subtasks(self):
+        task = self.create_task(title='1')
+        task.save()
+        subtasks = self.create_subtasks(task, 5)
+
+        page, has_more = Task.objects.page(task.id, after=subtasks[1].id, page_size=2)
+        self.assertEqual(page, subtasks[2:4])
+        self.assertTrue(has_more)
+
+        page, has_more = Task.objects.page(task.id, after=subtasks[3].id, page_size=2)
+        self.assertEqual(page, subtasks[4:])
+        self.assertFalse(has_more)
+
+
+class TaskHierarchyTest(UnitTest):
+    def create_tree(self):
+        # 1 -> 2 -> 3 -> 4, 1 -> 5
+        task = self.create_task(title='1')
+        task.save()
+        subtask, subsubtask, leaf = self.create_task_chain(parent=task, length=3)
+        other_subtask = self.create_task(title='5', parent=task)
+        other_subtask.save()
+        return task, subtask, subsubtask, leaf, other_subtask
+
+    def assert_hierarchy_is_consistent(self):
+        for task in Task.objects.all():
+            parent_path = task.parent.subtree_path if task.parent else ''
+            self.assertEqual(task.path, parent_path)
+            self.assertEqual(task.depth, task.parent.depth + 1 if task.parent else 0)
+
+    def test_sets_path_and_depth_when_creating_task(self):
+        task, subtask, subsubtask, leaf, other_subtask = self.create_tree()
+
+        self.assertEqual(Task.objects.get(id=task.id).path, '')
+        self.assertEqual(Task.objects.get(id=leaf.id).path, f'{task.id}/{subtask.id}/{subsubtask.id}/')
+        self.assertEqual(Task.objects.get(id=leaf.id).depth, 3)
+        self.assert_hierarchy_is_consistent()
+
+    def test_gets_ancestors_in_one_query(self):
+        task, subtask, subsubtask, leaf, other_subtask = self.create_tree()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(list(leaf.get_ancestors()), [task, subtask, subsubtask])
+
+    def test_gets_descendants_in_one_query(self):
+        task, subtask, subsubtask, leaf, other_subtask = self.create_tree()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(set(task.get_descendants()), {subtask, subsubtask, leaf, other_subtask})
+        self.assertEqual(set(subtask.get_descendants()), {subsubtask, leaf})
+
+    def test_moves_subtree_when_changing_parent(self):
+        task, subtask, subsubtask, leaf, other_subtask = self.create_tree()
+
+        subsubtask.parent = other_subtask
+        subsubtask.save(clean=False)
+
+        self.assert_hierarchy_is_consistent()
+        self.assertEqual(set(other_subtask.get_descendants()), {subsubtask, leaf})
+        self.assertEqual(set(subtask.get_descendants()), set())
+
+    def test_cannot_move_task_into_its_own_subtree(self):
+        task, subtask, subsubtask, leaf, other_subtask = self.create_tree()
+
+        subtask.parent = leaf
+        with self.assertRaises(ValidationError) as context:
+            subtask.save(clean=False)
+
+        self.assertIn('parent', context.exception.error_dict)
+        self.assert_hierarchy_is_consistent()
+
+    def test_subtasks_become_roots_when_deleting_task(self):
+        task, subtask, subsubtask, leaf, other_subtask = self.create_tree()
+
+        subtask.delete()
+
+        self.assert_hierarchy_is_consistent()
+        self.assertEqual(Task.objects.get(id=subsubtask.id).depth, 0)
+
+    def test_keeps_hierarchy_consistent_when_deleting_several_tasks_at_once(self):
+        task, subtask, subsubtask, leaf, other_subtask = self.create_tree()
+
+        Task.objects.filter(id__in=[task.id, subsubtask.id]).delete()
+
+        self.assert_hierarchy_is_consistent()
+        self.assertEqual(Task.objects.get(id=leaf.id).path, '')
+
+    def test_detaches_subtasks_of_deep_task_in_one_range_update(self):
+        task = self.create_task(title='1')
+        task.save()
+        *_, deep_task, leaf = self.create_task_chain(parent=task, length=60)
+
+        with CaptureQueriesContext(connection) as queries:
+            Task.objects.get(id=deep_task.id).delete()
+
+        detach_queries = [query['sql'] for query in queries if 'SUBSTR' in query['sql']]
+        self.assertEqual(len(detach_queries), 1)
+        self.assertNotIn('CASE', detach_queries[0])
+        self.assertLess(max(len(query['sql']) for query in queries), 2000)
+        self.assert_hierarchy_is_consistent()
+        self.assertEqual(Task.objects.get(id=leaf.id).depth, 0)
+
+    def test_migration_fills_paths_of_existing_tasks(self):
+        self.create_tree()
+        Task.objects.update(path='', depth=0)
+
+        migration = importlib.import_module('tasks.migrations.0011_task_path_depth')
+        migration.fill_paths(apps, None)
+
+        self.assert_hierarchy_is_consistent()
+
+
+class PlannedLaborIntensityRollupTest(UnitTest):
+    def expected_planned_labor_intensity(self, task):
+        planned_labor_intensity = task.deadline - task.created_at.replace(second=0, microsecond=0)
+        for subtask in task.task_set.all():
+            planned_labor_intensity += self.expected_planned_labor_intensity(subtask)
+        return planned_labor_intensity
+
+    def assert_rollups_are_consistent(self):
+        for task in Task.objects.all():
+            self.assertEqual(task.planned_labor_intensity, self.expected_planned_labor_intensity(task))
+
+    def count_queries_when_editing_leaf(self, depth):
+        task = self.create_task()
+        task.save()
+        leaf = self.create_task_chain(parent=task, length=depth)[-1]
+
+        leaf = Task.objects.get(id=leaf.id)
+        leaf.deadline = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+        with CaptureQueriesContext(connection) as queries:
+            leaf.save()
+        return len(queries)
+
+    def test_number_of_queries_doesnt_depend_on_depth(self):
+        shallow_tree_queries = self.count_queries_when_editing_leaf(depth=1)
+        deep_tree_queries = self.count_queries_when_editing_leaf(depth=15)
+
+        self.assertEqual(shallow_tree_queries, deep_tree_queries)
+        self.assertEqual(deep_tree_queries, 6)
+        self.assert_rollups_are_consistent()
+
+    def test_propagates_changes_to_all_ancestors(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask, leaf = self.create_task_chain(parent=task, length=3)
+        self.create_task_chain(parent=subtask, length=2)
+        self.assert_rollups_are_consistent()
+
+        leaf.deadline = datetime.datetime(2031, 3, 4, tzinfo=datetime.timezone.utc)
+        leaf.save()
+        self.assert_rollups_are_consistent()
+
+        subsubtask = Task.objects.get(id=subsubtask.id)
+        subsubtask.deadline = datetime.datetime(2025, 3, 4, tzinfo=datetime.timezone.utc)
+        subsubtask.save()
+        self.assert_rollups_are_consistent()
+
+    def test_moves_planned_labor_intensity_when_changing_parent(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+        other_task = self.create_task()
+        other_task.save()
+
+        subtask.parent = other_task
+        subtask.save()
+
+        self.assert_rollups_are_consistent()
+
+    def test_subtracts_deleted_subtask_from_all_ancestors(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask, leaf = self.create_task_chain(parent=task, length=3)
+
+        leaf.delete()
+
+        self.assert_rollups_are_consistent()
+
+    def test_subtracts_deleted_subtree_from_all_ancestors(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+        self.create_task_chain(parent=subsubtask, length=3)
+        self.create_task_chain(parent=subtask, length=2)
+
+        Task.objects.get(id=subsubtask.id).delete_subtree(chunk_size=2)
+
+        self.assert_rollups_are_consistent()
+
+
+class DeleteSubtreeTest(UnitTest):
+    def test_deletes_task_with_whole_subtree(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+        self.create_task_chain(parent=subsubtask, length=3)
+        other_subtask = self.create_task(parent=task)
+        other_subtask.save()
+
+        subtask.delete_subtree(chunk_size=2)
+
+        self.assertEqual(set(Task.objects.all()), {task, other_subtask})
+
+    def test_deletes_in_chunks_without_per_row_recalculation(self):
+        task = self.create_task()
+        task.save()
+        self.create_task_chain(parent=task, length=10)
+
+        with CaptureQueriesContext(connection) as queries:
+            task.delete_subtree(chunk_size=4)
+
+        deletes = [query for query in queries if query['sql'].startswith('DELETE FROM "tasks_task" ')]
+        self.assertEqual(len(deletes), 4)
+        self.assertFalse([query for query in queries if 'SUM(' in query['sql']])
+        self.assertEqual(Task.objects.count(), 0)
+
+
+class SubtreeStatsTest(UnitTest):
+    def expected_stats(self, task):
+        stats = dict.fromkeys(Task.STATUS_COUNT_FIELDS.values(), 0)
+        stats[Task.STATUS_COUNT_FIELDS[task.status]] += 1
+        for subtask in task.task_set.all():
+            for field, count in self.expected_stats(subtask).items():
+                stats[field] += count
+        return stats
+
+    def assert_stats_are_consistent(self):
+        for task in Task.objects.all():
+            self.assertEqual({field: getattr(task, field) for field in Task.STATUS_COUNT_FIELDS.values()},
+                             self.expected_stats(task))
+
+    def create_tree(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+        self.create_task_chain(parent=subsubtask, length=2)
+        other_subtask = self.create_task(parent=task)
+        other_subtask.save()
+        return task, subtask, subsubtask, other_subtask
+
+    def test_counts_created_subtasks(self):
+        task, *subtasks = self.create_tree()
+
+        task = Task.objects.get(id=task.id)
+        self.assertEqual(task.descendant_count, 5)
+        self.assertEqual(task.subtree_size, 6)
+        self.assertEqual(task.assigned_count, 6)
+        self.assertEqual(task.percent_complete, 0)
+        self.assert_stats_are_consistent()
+
+    def test_moves_counts_when_status_changes(self):
+        task, subtask, subsubtask, other_subtask = self.create_tree()
+
+        subsubtask = Task.objects.get(id=subsubtask.id)
+        subsubtask.status = 'PR'
+        subsubtask.save()
+
+        self.assertEqual(Task.objects.get(id=task.id).in_progress_count, 1)
+        self.assert_stats_are_consistent()
+
+    def test_moves_counts_when_changing_parent(self):
+        task, subtask, subsubtask, other_subtask = self.create_tree()
+
+        subsubtask = Task.objects.get(id=subsubtask.id)
+        subsubtask.parent = other_subtask
+        subsubtask.save()
+
+        self.assertEqual(Task.objects.get(id=subtask.id).descendant_count, 0)
+        self.assertEqual(Task.objects.get(id=other_subtask.id).descendant_count, 3)
+        self.assert_stats_are_consistent()
+
+    def test_subtracts_deleted_tasks(self):
+        task, subtask, subsubtask, other_subtask = self.create_tree()
+
+        Task.objects.get(id=subtask.id).delete()
+        self.assert_stats_are_consistent()
+
+        Task.objects.get(id=subsubtask.id).delete_subtree()
+        self.assert_stats_are_consistent()
+        self.assertEqual(Task.objects.get(id=task.id).descendant_count, 1)
+
+    def test_counts_completed_subtree(self):
+        task, subtask, subsubtask, other_subtask = self.create_tree()
+        Task.objects.update(status='PR', in_progress_count=F('assigned_count'), assigned_count=0)
+
+        subtask = Task.objects.get(id=subtask.id)
+        subtask.status = 'CM'
+        subtask.save()
+
+        task = Task.objects.get(id=task.id)
+        self.assertEqual(task.completed_count, 4)
+        self.assertEqual(task.percent_complete, 67)
+        self.assertEqual(Task.objects.get(id=subtask.id).percent_complete, 100)
+        self.assert_stats_are_consistent()
+
+    def test_counts_overdue_tasks_on_read(self):
+        task, subtask, subsubtask, other_subtask = self.create_tree()
+        Task.objects.filter(id=other_subtask.id).update(deadline=timezone.now() + datetime.timedelta(days=1))
+
+        self.assertEqual(task.get_overdue_count(), 5)
+        self.assertEqual(Task.objects.get(id=other_subtask.id).get_overdue_count(), 0)
+
+    def test_migration_fills_counts_for_existing_tasks(self):
+        self.create_tree()
+        Task.objects.update(status='PR')
+        Task.objects.update(**dict.fromkeys(Task.STATUS_COUNT_FIELDS.values(), 0))
+
+        migration = importlib.import_module('tasks.migrations.0014_task_status_counts')
+        migration.fill_status_counts(apps, None)
+
+        self.assert_stats_are_consistent()
+
+
+class CompletionTest(UnitTest):
+    def create_subtree(self, parent, width, depth, status='PR'):
+        subtasks = []
+        if depth == 0:
+            return subtasks
+        for i in range(width):
+            subtask = self.create_task(title=f'{parent.title}.{i}', parent=parent, status=status)
+            subtask.save(clean=False)
+            subtasks.append(subtask)
+            subtasks += self.create_subtree(subtask, width, depth - 1, status)
+        return subtasks
+
+    def create_task_in_progress(self):
+        task = self.create_task(title='1', status='PR')
+        task.save(clean=False)
+        return task
+
+    def complete(self, task):
+        task = Task.objects.get(id=task.id)
+        task.status = 'CM'
+        task.save()
+        return task
+
+    def test_completes_whole_subtree(self):
+        task = self.create_task_in_progress()
+        self.create_subtree(task, width=2, depth=3)
+
+        self.complete(task)
+
+        self.assertEqual(Task.objects.exclude(status='CM').count(), 0)
+        self.assertEqual(Task.objects.filter(completed_at__isnull=True).count(), 0)
+
+    def test_calculates_actual_completion_time_bottom_up(self):
+        task = self.create_task_in_progress()
+        self.create_subtree(task, width=2, depth=2)
+
+        task = self.complete(task)
+
+        for subtask in Task.objects.all():
+            expected_actual_completion_time = subtask.completed_at - subtask.created_at
+            for subsubtask in subtask.task_set.all():
+                expected_actual_completion_time += subsubtask.actual_completion_time
+            self.assertEqual(subtask.actual_completion_time, expected_actual_completion_time)
+
+    def test_number_of_queries_doesnt_depend_on_subtree_size(self):
+        small_task = self.create_task_in_progress()
+        self.create_subtree(small_task, width=1, depth=1)
+        large_task = self.create_task_in_progress()
+        self.create_subtree(large_task, width=3, depth=4)
+
+        with CaptureQueriesContext(connection) as small_subtree_queries:
+            self.complete(small_task)
+        with CaptureQueriesContext(connection) as large_subtree_queries:
+            self.complete(large_task)
+
+        self.assertEqual(len(small_subtree_queries), len(large_subtree_queries))
+
+    def test_names_first_offending_nested_subtask(self):
+        task = self.create_task_in_progress()
+        subtask_1, subtask_2 = self.create_subtree(task, width=2, depth=1)
+        subsubtask = self.create_task(title='Nested', parent=subtask_2, status='SP')
+        subsubtask.save(clean=False)
+        self.create_task(title='Later', parent=task, status='AS').save(clean=False)
+
+        with self.assertRaises(ValidationError) as context:
+            self.complete(task)
+
+        self.assertEqual(
+            f'The subtask "{subtask_2.title}" cannot be completed. '
+            f'The subtask "Nested" cannot be completed. '
+            f'The status "Completed" can only be set after the status "In Progress".',
+            context.exception.message
+        )
+        self.assertEqual(Task.objects.filter(status='CM').count(), 0)
+
+    def test_names_offending_subtasks_without_loading_them_again(self):
+        short_task = self.create_task_in_progress()
+        *_, short_leaf = self.create_subtree(short_task, width=1, depth=1)
+        long_task = self.create_task_in_progress()
+        *_, long_leaf = self.create_subtree(long_task, width=1, depth=4)
+        Task.objects.filter(id__in=[short_leaf.id, long_leaf.id]).update(status='AS')
+
+        with CaptureQueriesContext(connection) as short_chain_queries, self.assertRaises(ValidationError):
+            self.complete(short_task)
+        with CaptureQueriesContext(connection) as long_chain_queries, self.assertRaises(ValidationError) as context:
+            self.complete(long_task)
+
+        self.assertEqual(len(short_chain_queries), len(long_chain_queries))
+        self.assertEqual(context.exception.message.count('cannot be completed'), 4)
+
+
+class SaveTest(UnitTest):
+    def get_row_writes(self, queries, task):
+        return [query['sql'] for query in queries
+                if query['sql'].startswith(('INSERT', 'UPDATE'))
+                and re.search(rf'"tasks_task"."id" = {task.id}\)?$', query['sql'])]
+
+    def test_writes_only_changed_fields_once(self):
+        task = self.create_task()
+        task.save()
+        leaf = self.create_task_chain(parent=task, length=3)[-1]
+
+        leaf = Task.objects.get(id=leaf.id)
+        leaf.title = 'Buy green tea'
+        with CaptureQueriesContext(connection) as queries:
+            leaf.save()
+
+        writes = self.get_row_writes(queries, leaf)
+        self.assertEqual(len(writes), 1)
+        self.assertRegex(writes[0], r'^UPDATE "tasks_task" SET "title" = .+, "version" = \d+ WHERE')
+        self.assertEqual(Task.objects.get(id=leaf.id).title, 'Buy green tea')
+
+    def test_writes_derived_fields_with_changed_fields(self):
+        task = self.create_task()
+        task.save()
+        task = Task.objects.get(id=task.id)
+        task.status = 'PR'
+        task.save()
+
+        task.status = 'CM'
+        with CaptureQueriesContext(connection) as queries:
+            task.save()
+
+        self.assertEqual(len(self.get_row_writes(queries, task)), 1)
+        task = Task.objects.get(id=task.id)
+        self.assertEqual((task.completed_count, task.in_progress_count), (1, 0))
+        self.assertIsNotNone(task.actual_completion_time)
+
+    def test_doesnt_write_unchanged_task(self):
+        task = self.create_task()
+        task.save()
+        self.create_task_chain(parent=task, length=2)
+
+        task = Task.objects.get(id=task.id)
+        with CaptureQueriesContext(connection) as queries:
+            task.save()
+
+        writes = [query for query in queries if not query['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))]
+        self.assertFalse(writes)
+        self.assertEqual(Task.objects.get(id=task.id).version, task.version)
+
+    def test_inserts_new_task_without_updating_it(self):
+        task = self.create_task()
+        task.save()
+
+        subtask = self.create_task(parent=task)
+        with CaptureQueriesContext(connection) as queries:
+            subtask.save()
+
+        self.assertFalse(self.get_row_writes(queries, subtask))
+        self.assertEqual(Task.objects.get(id=subtask.id).assigned_count, 1)
+        self.assertEqual(Task.objects.get(id=task.id).assigned_count, 2)
+
+    def test_validates_status_against_loaded_value(self):
+        task = self.create_task()
+        task.save()
+        task = Task.objects.get(id=task.id)
+
+        task.status = 'CM'
+        with self.assertNumQueries(0), self.assertRaises(ValidationError):
+            task.clean()
+
+
+@override_settings(TASKS_BACKGROUND_ROLLUPS=True)
+class BackgroundRollupTest(UnitTest):
+    def setUp(self):
+        with override_settings(TASKS_BACKGROUND_ROLLUPS=False):
+            self.task = self.create_task()
+            self.task.save()
+            self.subtask, self.subsubtask, self.leaf = self.create_task_chain(parent=self.task, length=3)
+
+    def assert_totals_are_consistent(self):
+        for task in Task.objects.all():
+            expected = task.get_own_totals()
+            for subtask in task.get_descendants():
+                for field, total in subtask.get_own_totals().items():
+                    expected[field] += total
+            self.assertEqual({field: getattr(task, field) for field in expected}, expected)
+
+    def run_all_rollup_jobs(self, batch_size=100):
+        while run_rollup_jobs(batch_size):
+            pass
+
+    def test_queues_ancestors_instead_of_updating_them(self):
+        planned_labor_intensity = Task.objects.get(id=self.task.id).planned_labor_intensity
+
+        self.leaf.deadline = datetime.datetime(2031, 3, 4, tzinfo=datetime.timezone.utc)
+        with CaptureQueriesContext(connection) as queries:
+            self.leaf.save()
+
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "tasks_task"')
+                          and not re.search(rf'"tasks_task"."id" = {self.leaf.id}\)?$', query['sql'])])
+        self.assertEqual(Task.objects.get(id=self.task.id).planned_labor_intensity, planned_labor_intensity)
+        self.assertEqual(set(RollupJob.objects.values_list('task_id', flat=True)),
+                         {self.task.id, self.subtask.id, self.subsubtask.id})
+
+    def test_queues_every_ancestor_once(self):
+        self.create_task(parent=self.subsubtask).save()
+        self.create_task(parent=self.subsubtask).save()
+        self.leaf.delete()
+
+        self.assertEqual(RollupJob.objects.count(), 3)
+
+    def test_doesnt_queue_unchanged_totals(self):
+        self.leaf.title = 'Renamed'
+        self.leaf.save()
+
+        self.assertFalse(RollupJob.objects.exists())
+
+    def test_recomputes_queued_tasks_bottom_up(self):
+        self.create_task(parent=self.subsubtask).save()
+        self.create_task(parent=self.task).save()
+        self.leaf.deadline = datetime.datetime(2031, 3, 4, tzinfo=datetime.timezone.utc)
+        self.leaf.save()
+        subtask = Task.objects.get(id=self.subtask.id)
+        subtask.status = 'PR'
+        subtask.save()
+
+        # One task per batch, so every batch relies on the previous ones
+        self.run_all_rollup_jobs(batch_size=1)
+
+        self.assert_totals_are_consistent()
+        self.assertFalse(RollupJob.objects.exists())
+
+    def test_recomputes_ancestors_of_moved_and_deleted_tasks(self):
+        other = self.create_task(title='Other')
+        other.save()
+        subsubtask = Task.objects.get(id=self.subsubtask.id)
+        subsubtask.parent = other
+        subsubtask.save()
+        Task.objects.get(id=self.subtask.id).delete_subtree()
+
+        self.run_all_rollup_jobs()
+
+        self.assert_totals_are_consistent()
+
+    def test_keeps_tasks_queued_again_while_recomputing(self):
+        self.create_task(parent=self.leaf).save()
+        RollupJob.objects.filter(task=self.task).update(
+            updated_at=timezone.now() + datetime.timedelta(minutes=1)
+        )
+
+        run_rollup_jobs(100)
+
+        self.assertEqual(list(RollupJob.objects.values_list('task_id', flat=True)), [self.task.id])
+
+    def test_number_of_queries_doesnt_depend_on_depth(self):
+        def count_queries(task):
+            task = Task.objects.get(id=task.id)
+            task.deadline += datetime.timedelta(days=1)
+            with CaptureQueriesContext(connection) as queries:
+                task.save()
+            return len(queries)
+
+        self.assertEqual(count_queries(self.subtask), count_queries(self.leaf))
+
+    def test_reports_queue_depth_and_lag(self):
+        self.assertEqual(RollupJob.objects.stats(), {'depth': 0, 'lag': 0})
+
+        self.create_task(parent=self.leaf).save()
+        RollupJob.objects.update(enqueued_at=timezone.now() - datetime.timedelta(minutes=1))
+
+        stats = RollupJob.objects.stats()
+        self.assertEqual(stats['depth'], 4)
+        self.assertAlmostEqual(stats['lag'], 60, delta=1)
+
+
+class DeferredRollupTest(UnitTest):
+    def setUp(self):
+        self.task = self.create_task()
+        self.task.save()
+        self.subtask, self.parent = self.create_task_chain(parent=self.task, length=2)
+
+    def assert_totals_are_consistent(self):
+        for task in Task.objects.all():
+            expected = task.get_own_totals()
+            for subtask in task.get_descendants():
+                for field, total in subtask.get_own_totals().items():
+                    expected[field] += total
+            self.assertEqual({field: getattr(task, field) for field in expected}, expected)
+
+    def test_recomputes_each_ancestor_once_at_the_end(self):
+        with CaptureQueriesContext(connection) as queries:
+            with Task.objects.deferred_rollups():
+                for i in range(5):
+                    self.create_task(title=f'Batch {i}', parent=self.parent).save()
+                self.assertEqual(Task.objects.get(id=self.task.id).subtree_size, 3)
+
+        # One bulk update per level of ancestors
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "tasks_task" SET')
+                              and 'CASE WHEN' in query['sql']]), 3)
+        self.assertEqual(Task.objects.get(id=self.task.id).subtree_size, 8)
+        self.assert_totals_are_consistent()
+
+    def test_defers_rollups_of_edits_moves_and_deletes(self):
+        subtasks = []
+        for i in range(3):
+            subtasks.append(self.create_task(title=f'Batch {i}', parent=self.parent))
+            subtasks[-1].save()
+        other = self.create_task(title='Other')
+        other.save()
+
+        with Task.objects.deferred_rollups():
+            subtasks[0].deadline = datetime.datetime(2031, 3, 4, tzinfo=datetime.timezone.utc)
+            subtasks[0].save()
+            subtasks[1].parent = other
+            subtasks[1].save()
+            subtasks[2].delete()
+
+        self.assertEqual(Task.objects.get(id=self.task.id).subtree_size, 4)
+        self.assertEqual(Task.objects.get(id=other.id).subtree_size, 2)
+        self.assert_totals_are_consistent()
+
+    @override_settings(TASKS_BACKGROUND_ROLLUPS=True)
+    def test_queues_moves_in_background_mode(self):
+        # The totals of the moved task's subtask are still queued when it is moved
+        self.create_task_chain(parent=self.parent, length=2)
+        other = self.create_task(title='Other')
+        other.save()
+
+        with Task.objects.deferred_rollups():
+            self.parent.parent = other
+            self.parent.save()
+        self.assertTrue(RollupJob.objects.filter(task=other).exists())
+        while run_rollup_jobs(batch_size=100):
+            pass
+
+        self.assertEqual(Task.objects.get(id=other.id).subtree_size, 4)
+        self.assertEqual(Task.objects.get(id=self.task.id).subtree_size, 2)
+        self.assert_totals_are_consistent()
+
+    def test_rolls_back_everything_on_error(self):
+        with self.assertRaises(ValueError):
+            with Task.objects.deferred_rollups():
+                self.create_task(parent=self.parent).save()
+                raise ValueError
+
+        self.assertEqual(Task.objects.count(), 3)
+        self.assert_totals_are_consistent()
+
+    def test_nested_blocks_recompute_once(self):
+        with Task.objects.deferred_rollups():
+            with Task.objects.deferred_rollups():
+                self.create_task(parent=self.parent).save()
+            self.assertEqual(Task.objects.get(id=self.task.id).subtree_size, 3)
+
+        self.assertEqual(Task.objects.get(id=self.task.id).subtree_size, 4)
+
+
+def assert_totals_are_consistent(test):
+    for task in Task.objects.all():
+        expected = task.get_own_totals()
+        for subtask in task.get_descendants():
+            for field, total in subtask.get_own_totals().items():
+                expected[field] += total
+        test.assertEqual({field: getattr(task, field) for field in expected}, expected)
+
+
+class ConcurrencyTest(UnitTest):
+    def setUp(self):
+        self.task = self.create_task()
+        self.task.save()
+        self.subtask, self.leaf = self.create_task_chain(parent=self.task, length=2)
+
+    def test_rejects_edit_of_task_changed_since_loading(self):
+        task = Task.objects.get(id=self.subtask.id)
+        other = Task.objects.get(id=self.subtask.id)
+        other.title = 'Saved first'
+        other.save()
+
+        task.title = 'Saved second'
+        with self.assertRaises(ConcurrentUpdateError):
+            task.save()
+
+        self.assertEqual(Task.objects.get(id=self.subtask.id).title, 'Saved first')
+        assert_totals_are_consistent(self)
+
+    def test_rollups_dont_conflict_with_edits(self):
+        task = Task.objects.get(id=self.subtask.id)
+        self.create_task(parent=self.leaf).save()
+
+        task.deadline = datetime.datetime(2031, 3, 4, tzinfo=datetime.timezone.utc)
+        task.save()
+
+        self.assertEqual(Task.objects.get(id=self.subtask.id).version, 2)
+        assert_totals_are_consistent(self)
+
+    def test_calculates_totals_again_when_they_changed_meanwhile(self):
+        calculate_subtree_totals = Task.calculate_subtree_totals
+        calls = []
+
+        def calculate_from_outdated_totals(task):
+            calculate_subtree_totals(task)
+            calls.append(task.id)
+            if len(calls) == 1:
+                # As if another subtask rolled up into the row right after its totals were read
+                task._loaded_values = {**task._loaded_values,
+                                       'assigned_count': task._loaded_values['assigned_count'] - 1}
+
+        task = Task.objects.get(id=self.subtask.id)
+        task.parent = None
+        with mock.patch.object(Task, 'calculate_subtree_totals', calculate_from_outdated_totals):
+            task.save()
+
+        self.assertEqual(calls, [task.id, task.id])
+        self.assertEqual(Task.objects.get(id=self.leaf.id).path, f'{task.id}/')
+        assert_totals_are_consistent(self)
+
+    def test_calculates_parent_totals_again_when_deleting_subtask(self):
+        calculate_subtree_totals = Task.calculate_subtree_totals
+        calls = []
+
+        def calculate_from_outdated_totals(task):
+            calculate_subtree_totals(task)
+            calls.append(task.id)
+            if len(calls) == 1:
+                # As if another subtask was added to the parent right after its totals were read
+                task._loaded_values = {**task._loaded_values,
+                                       'assigned_count': task._loaded_values['assigned_count'] + 1}
+
+        with mock.patch.object(Task, 'calculate_subtree_totals', calculate_from_outdated_totals):
+            Task.objects.get(id=self.leaf.id).delete()
+
+        self.assertEqual(calls, [self.subtask.id, self.subtask.id])
+        self.assertEqual(Task.objects.get(id=self.task.id).subtree_size, 2)
+        assert_totals_are_consistent(self)
+
+    def test_gives_up_when_totals_keep_changing(self):
+        calculate_subtree_totals = Task.calculate_subtree_totals
+
+        def calculate_from_outdated_totals(task):
+            calculate_subtree_totals(task)
+            task._loaded_values = {**task._loaded_values, 'assigned_count': -1}
+
+        task = Task.objects.get(id=self.subtask.id)
+        task.deadline = datetime.datetime(2031, 3, 4, tzinfo=datetime.timezone.utc)
+        with mock.patch.object(Task, 'calculate_subtree_totals', calculate_from_outdated_totals):
+            with self.assertRaises(ConcurrentUpdateError):
+                task.save()
+
+        self.assertNotEqual(Task.objects.get(id=self.subtask.id).deadline, task.deadline)
+        assert_totals_are_consistent(self)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class ConcurrentWritersTest(TransactionTestCase):
+    def test_doesnt_lose_rollups(self):
+        root = Task(title='Root', description='Root', performers='Root', deadline='2030-01-01 10:00')
+        root.save()
+        parent = Task(title='Parent', description='Parent', performers='Parent', deadline='2030-01-01 10:00',
+                      parent=root)
+        parent.save()
+        errors = []
+
+        def add_subtasks(writer):
+            try:
+                for i in range(10):
+                    subtask = Task(title=f'{writer}.{i}', description='Subtask', performers='Writer',
+                                   deadline='2030-01-01 10:00', parent_id=parent.id)
+                    subtask.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def edit_parent():
+            try:
+                for i in range(10):
+                    def edit():
+                        task = Task.objects.get(id=parent.id)
+                        task.deadline = datetime.datetime(2030, 1, 2 + i, tzinfo=datetime.timezone.utc)
+                        task.save()
+                    retry_when_locked(edit)()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add_subtasks, args=(writer,)) for writer in range(4)]
+        threads.append(threading.Thread(target=edit_parent))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Task.objects.get(id=root.id).subtree_size, 42)
+        assert_totals_are_consistent(self)
+
+
+class RetryWhenLockedTest(UnitTest):
+    def run_failing(self, *errors):
+        calls = []
+
+        @retry_when_locked
+        def write():
+            calls.append(len(calls))
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return 'written'
+
+        return write, calls
+
+    @override_settings(TASKS_WRITE_RETRY_DELAY=0)
+    def test_retries_locked_writes(self):
+        write, calls = self.run_failing(OperationalError('database is locked'),
+                                        OperationalError('database table is locked: tasks_task'))
+        # Test cases run in a transaction, which a retry has to be outside of
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(write(), 'written')
+        self.assertEqual(len(calls), 3)
+
+    @override_settings(TASKS_WRITE_RETRY_DELAY=0, TASKS_WRITE_RETRIES=2)
+    def test_gives_up_after_retries(self):
+        write, calls = self.run_failing(*[OperationalError('database is locked')] * 3)
+        with mock.patch.object(connection, 'in_atomic_block', False), self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 3)
+
+    def test_doesnt_retry_other_errors_or_inside_transactions(self):
+        write, calls = self.run_failing(OperationalError('no such table: tasks_task'))
+        with mock.patch.object(connection, 'in_atomic_block', False), self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+        write, calls = self.run_failing(OperationalError('database is locked'))
+        with transaction.atomic(), self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+    def test_restores_task_after_failed_save(self):
+        task = self.create_task()
+        task.save()
+        subtask = self.create_task(parent=task)
+
+        with mock.patch.object(Task, 'save_changes', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                subtask.save()
+
+        self.assertTrue(subtask._state.adding)
+        self.assertIsNone(subtask.id)
+        subtask.save()
+        self.assertEqual(Task.objects.get(id=task.id).subtree_size, 2)
+
+    def test_configures_sqlite_connections(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+
+
+class SearchIndexTest(UnitTest):
+    def search_titles(self, text, **kwargs):
+        return [task.title for task in search(text, 10, **kwargs)]
+
+    def test_indexes_created_tasks(self):
+        self.create_task(title='Buy puer', description='At the tea shop').save()
+        self.create_task(title='Write report', description='About coffee').save()
+
+        self.assertEqual(self.search_titles('shop'), ['Buy puer'])
+        self.assertEqual(self.search_titles('report'), ['Write report'])
+
+    def test_indexes_bulk_created_tasks(self):
+        Task.objects.bulk_create([self.create_task(title='Brew oolong')])
+
+        self.assertEqual(self.search_titles('oolong'), ['Brew oolong'])
+
+    def test_reindexes_changed_tasks(self):
+        task = self.create_task(title='Buy puer', description='At the shop')
+        task.save()
+        task.title = 'Buy oolong'
+        task.save()
+        Task.objects.filter(id=task.id).update(performers='Anna Karenina')
+
+        self.assertEqual(self.search_titles('puer'), [])
+        self.assertEqual(self.search_titles('oolong'), ['Buy oolong'])
+        self.assertEqual(self.search_titles('karenina'), ['Buy oolong'])
+
+    def test_removes_deleted_tasks(self):
+        task = self.create_task(title='Buy puer')
+        task.save()
+        subtask, = self.create_task_chain(parent=task, length=1)
+        task.delete_subtree()
+
+        self.assertEqual(self.search_titles('puer'), [])
+        self.assertEqual(self.search_titles('subtask'), [])
+
+    def test_matches_last_word_as_prefix(self):
+        self.create_task(title='Buy puer tea', description='At the shop').save()
+
+        self.assertEqual(self.search_titles('puer te'), ['Buy puer tea'])
+        self.assertEqual(self.search_titles('pu tea'), [])
+        self.assertEqual(self.search_titles('puer te', prefix=False), [])
+
+    def test_ranks_title_matches_first(self):
+        self.create_task(title='Write report', description='Mention the tea', performers='Anna').save()
+        self.create_task(title='Buy tea', description='Puer', performers='Anna').save()
+
+        self.assertEqual(self.search_titles('tea'), ['Buy tea', 'Write report'])
+
+    def test_highlights_escaped_snippets(self):
+        self.create_task(title='Buy <b>tea</b>', description='Buy puer tea & oolong').save()
+
+        task, = search('tea', 10)
+
+        self.assertEqual(task.title_snippet, 'Buy &lt;b&gt;<mark>tea</mark>&lt;/b&gt;')
+        self.assertEqual(task.description_snippet, 'Buy puer <mark>tea</mark> &amp; oolong')
+
+    def test_quotes_search_syntax(self):
+        self.assertEqual(match_query('tea OR "coffee* NEAR(a b)'), '"tea" "OR" "coffee" "NEAR" "a" "b"*')
+        self.assertEqual(match_query(' *"() '), '')
+        self.assertEqual(search(' *"() ', 10), [])
+
+
+class PerformerTest(UnitTest):
+    def assignee_names(self, task):
+        return sorted(task.assignees.values_list('name', flat=True))
+
+    def test_parses_performers(self):
+        self.assertEqual(parse_performers(' Ivan  Petrov, anna;Anna\nIVAN petrov ,, '),
+                         {'ivan petrov': 'Ivan Petrov', 'anna': 'anna'})
+
+    def test_assigns_parsed_performers(self):
+        task = self.create_task(performers='Ivan Petrov, Anna')
+        task.save()
+        other_task = self.create_task(performers='anna')
+        other_task.save()
+
+        self.assertEqual(self.assignee_names(task), ['Anna', 'Ivan Petrov'])
+        self.assertEqual(self.assignee_names(other_task), ['Anna'])
+        self.assertEqual(Performer.objects.count(), 2)
+
+    def test_reassigns_changed_performers(self):
+        task = self.create_task(performers='Ivan Petrov, Anna')
+        task.save()
+        task = Task.objects.get(id=task.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            task.save()
+        self.assertFalse([query for query in queries if 'tasks_task_assignees' in query['sql']])
+
+        task.performers = 'Anna; Boris'
+        task.save()
+        self.assertEqual(self.assignee_names(task), ['Anna', 'Boris'])
+
+    def test_matches_autocomplete_prefix_by_index(self):
+        self.create_task(performers='Ivan Petrov, Ivanna, Anna Ivanova').save()
+
+        self.assertEqual([performer.name for performer in Performer.objects.autocomplete(' iVan')],
+                         ['Ivan Petrov', 'Ivanna'])
+        self.assertIn('USING INDEX', Performer.objects.autocomplete('ivan').explain())
+
+    def test_counts_open_tasks_and_workload(self):
+        task = self.create_task(performers='Ivan')
+        task.save()
+        subtask = self.create_task(performers='Ivan, Anna', parent=task)
+        subtask.save()
+        completed_task = self.create_task(performers='Ivan')
+        completed_task.save()
+        Task.objects.filter(id=completed_task.id).update(status=Task.Status.COMPLETED)
+        task.refresh_from_db()
+        subtask.refresh_from_db()
+
+        ivan, anna = Performer.objects.with_workload().order_by('-key')
+
+        self.assertEqual((ivan.task_count, ivan.open_task_count), (3, 2))
+        self.assertEqual(ivan.planned_workload, task.planned_labor_intensity + subtask.planned_labor_intensity)
+        self.assertEqual((anna.task_count, anna.open_task_count), (1, 1))
+        self.assertEqual(list(ivan.get_open_tasks()), [task, subtask])
+
+    def test_deleting_task_unassigns_performers(self):
+        task = self.create_task(performers='Ivan')
+        task.save()
+        task.delete()
+
+        self.assertEqual(Performer.objects.get().tasks.count(), 0)
+
+    def test_migration_parses_performers_of_existing_tasks(self):
+        task = self.create_task(performers='Ivan Petrov, Anna')
+        task.save()
+        other_task = self.create_task(performers='ANNA')
+        other_task.save()
+        Performer.objects.all().delete()
+
+        migration = importlib.import_module('tasks.migrations.0016_performers')
+        migration.parse_performers(apps, None)
+
+        self.assertEqual(self.assignee_names(task), ['Anna', 'Ivan Petrov'])
+        self.assertEqual(self.assignee_names(other_task), ['Anna'])
+
+
+class QueryPlanTest(UnitTest):
+    def setUp(self):
+        self.task = self.create_task()
+        self.task.save()
+        self.subtask, = self.create_task_chain(parent=self.task, length=1)
+
+    def test_open_tasks_by_deadline_use_partial_index(self):
+        self.assertUsesIndexes(Task.objects.open().order_by('deadline'), ordered=True)
+        self.assertUsesIndexes(Task.objects.open().filter(deadline__lt=timezone.now()))
+        self.assertIn('task_open_deadline_idx', Task.objects.open().order_by('deadline').explain())
+
+    def test_subtasks_by_status_use_index(self):
+        self.assertUsesIndexes(Task.objects.filter(parent=self.task, status=Task.Status.IN_PROGRESS))
+        self.assertIn('COVERING INDEX task_parent_status_idx',
+                      Task.objects.filter(parent=self.task).values('status').annotate(count=Count('id')).explain())
+
+    def test_tasks_by_creation_use_index(self):
+        self.assertUsesIndexes(Task.objects.roots().order_by('created_at'), ordered=True)
+        self.assertUsesIndexes(Task.objects.filter(parent=self.task).order_by('created_at'), ordered=True)
+
+    def test_tree_queries_use_indexes(self):
+        self.assertUsesIndexes(Task.objects.filter(parent_id=None).annotate(subtask_count=Count('task')))
+        self.assertUsesIndexes(self.task.get_descendants())
+        self.assertUsesIndexes(self.task.get_ancestors())
+        self.assertUsesIndexes(Task.objects.open().filter(Q(id=self.task.id) | subtree_lookup(self.task.subtree_path),
+                                                          deadline__lt=timezone.now()))
+
+    def test_performer_queries_use_indexes(self):
+        performer = Performer.objects.get()
+
+        self.assertUsesIndexes(performer.get_open_tasks())
+        self.assertUsesIndexes(Performer.objects.autocomplete('vlad').with_workload())
+
+    def test_reports_table_scans(self):
+        with self.assertRaises(AssertionError):
+            self.assertUsesIndexes(Task.objects.filter(title='Buy tea'))
+        with self.assertRaises(AssertionError):
+            self.assertUsesIndexes(Task.objects.open().order_by('title'), ordered=True)
@@ -1,13 +1,26 @@
+import asyncio
 import json
 import re
+import tempfile
 from datetime import timezone, timedelta
+from unittest import mock
 
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
 from django.http import JsonResponse
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.template.loader import render_to_string
 from django.utils.html import escape
 from django.utils import timezone as dj_timezone
 
-from tasks.models import Task
+from tasks import async_views, views
+from tasks.cache import TREE_VERSION_KEY, get_tree_version
+from tasks.instrumentation import QueryBudgetExceeded, RequestMetrics, summary
+from tasks.listing import list_queryset
+from tasks.models import Performer, RollupJob, Task
+from tasks.rollups import run_rollup_jobs
 from tasks.forms import TaskForm, EmptyFieldErrorMessage
 from .base import UnitTest
 
@@ -41,6 +54,167 @@ class HomePageTest(UnitTest):
         self.assertIn(task, response.context['tasks'])
         self.assertNotIn(subtask, response.context['tasks'])
 
+    def test_number_of_queries_doesnt_depend_on_tree_size(self):
+        task = self.create_task()
+        task.save()
+        with CaptureQueriesContext(connection) as small_tree_queries:
+            self.client.get('/')
+
+        self.create_task_chain(parent=task, length=5)
+        self.create_task_chain(parent=task, length=3)
+        with CaptureQueriesContext(connection) as large_tree_queries:
+            response = self.client.get('/')
+
+        self.assertEqual(len(small_tree_queries), len(large_tree_queries))
+        self.assertContains(response, 'class="task-title"', count=9)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                      'LOCATION': 'sidebar-cache-test'}})
+class SidebarCacheTest(UnitTest):
+    def setUp(self):
+        cache.clear()
+
+    def save_and_commit(self, task):
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        return task
+
+    def test_doesnt_query_tasks_when_sidebar_is_cached(self):
+        self.save_and_commit(self.create_task(title='Cached task'))
+        self.client.get('/')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+
+        self.assertContains(response, 'Cached task')
+        self.assertFalse([query for query in queries if 'tasks_task' in query['sql']])
+
+    def test_shows_saved_tasks(self):
+        task = self.save_and_commit(self.create_task(title='Old title'))
+        self.client.get('/')
+
+        task.title = 'New title'
+        self.save_and_commit(task)
+        self.save_and_commit(self.create_task(title='Subtask', parent=task))
+        response = self.client.get('/')
+
+        self.assertContains(response, 'New title')
+        self.assertContains(response, 'Subtask')
+        self.assertNotContains(response, 'Old title')
+
+    def test_hides_deleted_tasks(self):
+        task = self.save_and_commit(self.create_task(title='Deleted task'))
+        self.client.get('/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        response = self.client.get('/')
+
+        self.assertNotContains(response, 'Deleted task')
+
+    def test_invalidates_sidebar_after_bulk_updates(self):
+        self.save_and_commit(self.create_task(title='Old title'))
+        self.client.get('/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.update(title='New title')
+        response = self.client.get('/')
+
+        self.assertContains(response, 'New title')
+
+    def test_never_reuses_tree_version(self):
+        versions = {get_tree_version()}
+        for title in ['First', 'Second']:
+            self.save_and_commit(self.create_task(title=title))
+            versions.add(get_tree_version())
+        cache.delete(TREE_VERSION_KEY)
+        versions.add(get_tree_version())
+
+        self.assertEqual(len(versions), 4)
+
+    def test_counts_hits_and_misses(self):
+        self.client.get('/')
+        self.client.get('/')
+        self.client.get('/')
+
+        stats = json.loads(self.client.get('/tasks/sidebar-cache-stats').content)
+
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+
+    def test_works_with_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                                   'LOCATION': cache_dir}}):
+                task = self.save_and_commit(self.create_task(title='Old title'))
+                self.client.get('/')
+                task.title = 'New title'
+                self.save_and_commit(task)
+
+                response = self.client.get('/')
+
+                self.assertContains(response, 'New title')
+                self.assertEqual(json.loads(self.client.get('/tasks/sidebar-cache-stats').content)['misses'], 2)
+
+
+@override_settings(TASKS_SIDEBAR_DEPTH=1, TASKS_SIDEBAR_PAGE_SIZE=2)
+class LazySidebarTest(UnitTest):
+    def test_renders_collapsed_tasks_with_subtask_count(self):
+        task = self.create_task(title='Root task')
+        task.save()
+        self.create_task(title='Hidden subtask', parent=task).save()
+
+        response = self.client.get('/')
+
+        self.assertContains(response, 'Root task')
+        self.assertNotContains(response, 'Hidden subtask')
+        self.assertContains(response, f'data-url="/tasks/{task.id}/subtasks/"')
+        self.assertContains(response, 'Show subtasks (1)')
+
+    def test_renders_first_page_of_root_tasks(self):
+        tasks = [self.create_task(title=f'Task {i}') for i in range(3)]
+        for task in tasks:
+            task.save()
+
+        response = self.client.get('/')
+
+        self.assertContains(response, 'class="task-title"', count=2)
+        self.assertContains(response, f'data-url="/tasks/roots/?after={tasks[1].id}"')
+
+    def test_loads_subtasks_page_by_page(self):
+        task = self.create_task(title='Root task')
+        task.save()
+        subtasks = [self.create_task(title=f'Subtask {i}', parent=task) for i in range(3)]
+        for subtask in subtasks:
+            subtask.save()
+        self.create_task(title='Nested subtask', parent=subtasks[0]).save()
+
+        response = self.client.get(f'/tasks/{task.id}/subtasks/')
+        self.assertContains(response, 'class="task-title"', count=2)
+        self.assertContains(response, 'Show subtasks (1)')
+        self.assertContains(response, f'data-url="/tasks/{task.id}/subtasks/?after={subtasks[1].id}"')
+
+        response = self.client.get(f'/tasks/{task.id}/subtasks/?after={subtasks[1].id}')
+        self.assertContains(response, 'class="task-title"', count=1)
+        self.assertContains(response, 'Subtask 2')
+        self.assertNotContains(response, 'Show more')
+
+    def test_loads_root_tasks_page_by_page(self):
+        tasks = [self.create_task(title=f'Task {i}') for i in range(3)]
+        for task in tasks:
+            task.save()
+
+        response = self.client.get(f'/tasks/roots/?after={tasks[1].id}')
+
+        self.assertContains(response, 'class="task-title"', count=1)
+        self.assertContains(response, 'Task 2')
+
+    def test_subtasks_of_not_existing_task_returns_http404(self):
+        response = self.client.get('/tasks/532/subtasks/')
+        self.assertEqual(response.status_code, 404)
+
 
 class NewTaskTest(UnitTest):
     def test_can_save_a_POST_request(self):
@@ -217,6 +391,30 @@ class TaskDetailTest(UnitTest):
         self.assertIn(correct_task.title, ajax_response_json['form'])
         self.assertNotIn(other_task.title, ajax_response_json['form'])
 
+    @override_settings(TASKS_BACKGROUND_ROLLUPS=True)
+    def test_marks_stale_totals(self):
+        task = self.create_task()
+        task.save()
+        self.assertNotIn('id="id_stale_totals"', self.ajax_get(task.id).json()['form'])
+
+        self.create_task(parent=task).save()
+
+        self.assertIn('id="id_stale_totals"', self.ajax_get(task.id).json()['form'])
+        response = self.client.get(f'/tasks/{task.id}/')
+        self.assertTrue(response.context['task_detail_form'].instance.stale_totals)
+
+    def test_shows_subtree_stats(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+
+        response = self.client.get(f'/tasks/{task.id}/')
+
+        self.assertContains(response, '0% (0 of 3 tasks completed)')
+        self.assertContains(response, '2: 3 assigned, 0 in progress, 0 suspended, 0 completed, 3 overdue')
+        self.assertContains(response, '<span class="progress-badge" title="0 of 2 tasks completed">0%</span>',
+                            html=True)
+
     def test_shows_correct_created_at_value_to_template(self):
         task = self.create_task()
         task.save()
@@ -361,6 +559,25 @@ class TaskDetailTest(UnitTest):
         self.assertEqual(response.status_code, 404)
         self.assertIn( 'Not Found', response.content.decode('utf8'))
 
+    def test_number_of_queries_doesnt_depend_on_subtree_size(self):
+        task = self.create_task()
+        task.save()
+        with CaptureQueriesContext(connection) as small_tree_ajax_queries:
+            self.ajax_get(task.id)
+        with CaptureQueriesContext(connection) as small_tree_queries:
+            self.client.get(f'/tasks/{task.id}/')
+
+        self.create_task_chain(parent=task, length=5)
+        self.create_task_chain(parent=task, length=3)
+        with CaptureQueriesContext(connection) as large_tree_ajax_queries:
+            ajax_response = self.ajax_get(task.id)
+        with CaptureQueriesContext(connection) as large_tree_queries:
+            self.client.get(f'/tasks/{task.id}/')
+
+        self.assertEqual(len(small_tree_ajax_queries), len(large_tree_ajax_queries))
+        self.assertEqual(len(small_tree_queries), len(large_tree_queries))
+        self.assertEqual(json.loads(ajax_response.content)['form'].count('class="task-title"'), 8)
+
     def test_passes_to_home_template_only_tasks_with_null_parent(self):
         task = self.create_task()
         task.save()
@@ -411,6 +628,26 @@ class TaskDetailTest(UnitTest):
         response = self.client.post(f'/tasks/{task.id}/', data=new_data)
         self.assertRedirects(response, f'/tasks/{task.id}/')
 
+    def test_renders_version_of_task(self):
+        task = self.create_task()
+        task.save()
+
+        response = self.client.get(f'/tasks/{task.id}/')
+        self.assertContains(response, f'<input type="hidden" name="version" value="{task.version}"')
+
+    def test_shows_conflict_when_task_changed_after_rendering(self):
+        task = self.create_task()
+        task.save()
+        rendered_version = task.version
+        task.title = 'Changed meanwhile'
+        task.save()
+
+        data = {**UnitTest.VALID_TASK_DATA, 'title': 'Stale edit', 'version': rendered_version}
+        response = self.client.post(f'/tasks/{task.id}/', data=data)
+
+        self.assertContains(response, 'The task was changed by someone else while you were editing it.')
+        self.assertEqual(Task.objects.get(id=task.id).title, 'Changed meanwhile')
+
     def post_invalid_input(self):
         task = self.create_task()
         task.save()
@@ -574,6 +811,266 @@ class TaskDetailTest(UnitTest):
                                     f'The status "Completed" can only be set after the status "In Progress".'))
 
 
+class TaskJSONTest(UnitTest):
+    def get_json(self, task_id, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(f'/tasks/{task_id}/json', headers=headers)
+
+    def test_returns_task_fields_and_computed_durations(self):
+        task = self.create_task(status='PR')
+        task.save(clean=False)
+        task.status = 'CM'
+        task.save()
+        task = Task.objects.get(id=task.id)
+
+        data = self.get_json(task.id).json()
+
+        self.assertEqual(data['id'], task.id)
+        self.assertEqual(data['title'], task.title)
+        self.assertEqual(data['description'], task.description)
+        self.assertEqual(data['performers'], task.performers)
+        self.assertEqual(data['status'], 'CM')
+        self.assertEqual(data['status_display'], 'Completed')
+        self.assertEqual(data['display']['deadline'], UnitTest.VALID_TASK_DATA['deadline'])
+        self.assertEqual(data['planned_labor_intensity'], task.planned_labor_intensity.total_seconds())
+        self.assertEqual(data['actual_completion_time'], task.actual_completion_time.total_seconds())
+        self.assertEqual(
+            data['display']['created_at'],
+            task.created_at.astimezone(timezone(timedelta(hours=7))).strftime(UnitTest.DATETIME_FORMAT)
+        )
+        self.assertEqual(data['urls'], {'detail': f'/tasks/{task.id}/',
+                                        'delete': f'/tasks/{task.id}/delete',
+                                        'new_subtask': f'/tasks/{task.id}/subtasks/new'})
+
+    def test_returns_direct_subtasks(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+
+        data = self.get_json(task.id).json()
+
+        self.assertEqual(len(data['subtasks']), 1)
+        self.assertEqual(data['subtasks'][0]['id'], subtask.id)
+        self.assertEqual(data['subtasks'][0]['title'], subtask.title)
+        self.assertEqual(data['subtasks'][0]['subtask_count'], 1)
+        self.assertEqual(data['subtasks'][0]['stats']['descendant_count'], 1)
+        self.assertEqual(data['stats']['subtree_size'], 3)
+        self.assertEqual(data['stats']['overdue_count'], 3)
+        self.assertEqual(data['subtasks'][0]['json_url'], f'/tasks/{subtask.id}/json')
+
+    @override_settings(TASKS_BACKGROUND_ROLLUPS=True)
+    def test_marks_stale_totals(self):
+        task = self.create_task()
+        task.save()
+        self.assertFalse(self.get_json(task.id).json()['stats']['stale'])
+
+        self.create_task(parent=task).save()
+        self.assertTrue(self.get_json(task.id).json()['stats']['stale'])
+
+        response = self.client.get('/tasks/rollup-queue-stats')
+        self.assertEqual(response.json()['depth'], 1)
+        self.assertEqual(RollupJob.objects.get().task_id, task.id)
+
+    @override_settings(TASKS_BACKGROUND_ROLLUPS=True)
+    def test_changes_etag_when_rollups_are_queued(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+        run_rollup_jobs(batch_size=10)
+        etag = self.get_json(task.id)['ETag']
+
+        subsubtask.status = 'PR'
+        subsubtask.save()
+        response = self.get_json(task.id, etag=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['stats']['stale'])
+
+        run_rollup_jobs(batch_size=10)
+        response = self.get_json(task.id, etag=response['ETag'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['stats']['stale'])
+        self.assertEqual(response.json()['stats']['in_progress_count'], 1)
+
+    def test_returns_not_modified_for_current_etag(self):
+        task = self.create_task()
+        task.save()
+
+        response = self.get_json(task.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(2):
+            not_modified_response = self.get_json(task.id, etag=response['ETag'])
+        self.assertEqual(not_modified_response.status_code, 304)
+        self.assertEqual(not_modified_response.content, b'')
+
+    def test_changes_etag_when_task_or_its_subtasks_change(self):
+        task = self.create_task()
+        task.save()
+        etags = [self.get_json(task.id)['ETag']]
+
+        task.title = 'New title'
+        task.save()
+        etags.append(self.get_json(task.id)['ETag'])
+
+        subtask = self.create_task(parent=task)
+        subtask.save()
+        etags.append(self.get_json(task.id)['ETag'])
+
+        Task.objects.filter(id=subtask.id).update(title='Renamed subtask')
+        etags.append(self.get_json(task.id)['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+        self.assertEqual(self.get_json(task.id, etag=etags[0]).status_code, 200)
+
+    def test_for_not_existing_task_returns_http404(self):
+        self.assertEqual(self.get_json(532).status_code, 404)
+
+
+class ExportTasksTest(UnitTest):
+    def get_content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_streams_all_tasks_as_csv(self):
+        task = self.create_task()
+        task.save()
+        subtask = self.create_task(title='Heat water', parent=task)
+        subtask.save()
+
+        response = self.client.get('/tasks/export.csv')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tasks.csv"')
+        header, *rows = self.get_content(response).splitlines()
+        self.assertEqual(header.split(',')[:3], ['id', 'parent', 'title'])
+        self.assertIn('planned_labor_intensity', header)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[0].startswith(f'{task.id},,Buy tea,'))
+        self.assertTrue(rows[1].startswith(f'{subtask.id},{task.id},Heat water,'))
+
+    def test_streams_subtree_as_ndjson(self):
+        self.create_task(title='Other task').save()
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+
+        response = self.client.get(f'/tasks/{subtask.id}/export.ndjson')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.get_content(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [subtask.id, subsubtask.id])
+        self.assertIsNone(rows[0]['parent'])
+        self.assertEqual(rows[1]['parent'], subtask.id)
+        self.assertEqual(
+            rows[0]['planned_labor_intensity'],
+            Task.objects.get(id=subtask.id).planned_labor_intensity.total_seconds()
+        )
+        self.assertEqual(rows[0]['created_at'], subtask.created_at.isoformat())
+
+    def test_exports_only_task_without_subtree(self):
+        task = self.create_task()
+        task.save()
+        self.create_task_chain(parent=task, length=2)
+
+        response = self.client.get(f'/tasks/{task.id}/export.ndjson?subtree=0')
+
+        rows = [json.loads(line) for line in self.get_content(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [task.id])
+
+    def test_reads_rows_in_chunks(self):
+        task = self.create_task()
+        task.save()
+        self.create_task_chain(parent=task, length=4)
+
+        with override_settings(TASKS_EXPORT_CHUNK_SIZE=2), CaptureQueriesContext(connection) as queries:
+            rows = self.get_content(self.client.get('/tasks/export.ndjson')).splitlines()
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len(queries), 1)
+
+    def test_for_unknown_format_or_task_returns_http404(self):
+        self.assertEqual(self.client.get('/tasks/export.xml').status_code, 404)
+        self.assertEqual(self.client.get('/tasks/532/export.csv').status_code, 404)
+
+
+class QueryMetricsTest(UnitTest):
+    def setUp(self):
+        summary.clear()
+
+    def test_reports_queries_and_timings_in_headers(self):
+        task = self.create_task()
+        task.save()
+
+        response = self.client.get(f'/tasks/{task.id}/')
+
+        self.assertEqual(response['X-Query-Count'], '4')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="4 queries", ')
+        self.assertIn('dup;desc="0 duplicate, 0 similar queries"', response['Server-Timing'])
+        render_time = float(re.search(r'tpl;dur=([\d.]+)', response['Server-Timing']).group(1))
+        self.assertGreater(render_time, 0)
+
+    def test_removes_query_recorder_after_request(self):
+        self.client.get('/')
+        self.client.get('/')
+
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_counts_duplicate_and_similar_queries(self):
+        metrics = RequestMetrics()
+        execute = mock.Mock()
+
+        metrics(execute, 'SELECT %s', [1], False, {})
+        metrics(execute, 'SELECT %s', [1], False, {})
+        metrics(execute, 'SELECT %s', [2], False, {})
+
+        self.assertEqual(execute.call_count, 3)
+        self.assertEqual(metrics.queries, 3)
+        self.assertEqual(metrics.duplicates, 1)
+        self.assertEqual(metrics.similar, 2)
+
+    def test_summarizes_requests_per_view(self):
+        self.client.get('/')
+        self.client.get('/')
+
+        data = self.client.get('/tasks/metrics').json()
+
+        self.assertEqual(data['home']['requests'], 2)
+        self.assertEqual(data['home']['queries_max'], 1)
+        self.assertIn('db_time_avg_ms', data['home'])
+        self.assertIn('render_time_avg_ms', data['home'])
+
+    def test_fails_when_view_exceeds_its_query_budget(self):
+        with mock.patch.object(views.home_page, 'query_budget', 0):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'The view "home" ran 1 queries'):
+                self.client.get('/')
+
+    @override_settings(TASKS_QUERY_BUDGETS_STRICT=False)
+    def test_logs_exceeded_query_budget_outside_of_tests(self):
+        with mock.patch.object(views.home_page, 'query_budget', 0), \
+                self.assertLogs('tasks.instrumentation', 'WARNING'):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_views_stay_within_budget_on_big_trees(self):
+        task = self.create_task(status='PR')
+        task.save(clean=False)
+        for subtask in self.create_task_chain(parent=task, length=5):
+            self.create_task_chain(parent=subtask, length=3)
+        Task.objects.update(status='PR')
+
+        self.client.get('/')
+        self.client.get(f'/tasks/{task.id}/')
+        self.client.get(f'/tasks/{task.id}/json')
+        self.client.post(f'/tasks/{task.id}/subtasks/new', data=UnitTest.VALID_TASK_DATA)
+        Task.objects.update(status='PR')
+        self.client.post(f'/tasks/{task.id}/', data={**UnitTest.VALID_TASK_DATA, 'status': 'CM'})
+        self.assertEqual(Task.objects.get(id=task.id).status, 'CM')
+
+
 class DeleteTaskTest(UnitTest):
     def test_can_delete_task_via_POST_request(self):
         task = self.create_task()
@@ -584,6 +1081,28 @@ class DeleteTaskTest(UnitTest):
 
         self.assertEqual(Task.objects.count(), 0)
 
+    def test_keeps_subtasks_as_root_tasks(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+
+        self.client.post(f'/tasks/{task.id}/delete', data={'delete': ''})
+
+        self.assertEqual(Task.objects.get(id=subtask.id).parent, None)
+        self.assertEqual(Task.objects.get(id=subsubtask.id).path, f'{subtask.id}/')
+
+    def test_can_delete_task_with_subtasks(self):
+        task = self.create_task()
+        task.save()
+        subtask, subsubtask = self.create_task_chain(parent=task, length=2)
+        self.create_task_chain(parent=subsubtask, length=2)
+
+        self.client.post(f'/tasks/{subtask.id}/delete', data={'delete': '', 'cascade': 'on'})
+
+        task = Task.objects.get(id=task.id)
+        self.assertEqual(list(Task.objects.all()), [task])
+        self.assertEqual(task.planned_labor_intensity, task.get_own_planned_labor_intensity())
+
     def test_redirects_after_POST(self):
         task = self.create_task()
         task.save()
@@ -640,3 +1159,271 @@ class DeleteTaskTest(UnitTest):
 
         self.assertIn(task, response.context['tasks'])
         self.assertNotIn(subtask, response.context['tasks'])
+
+
+class SearchTasksTest(UnitTest):
+    def test_returns_ranked_results_with_snippets(self):
+        task = self.create_task(title='Buy tea', description='Puer tea from the shop')
+        task.save()
+        subtask = self.create_task(title='Write report', description='About tea', parent=task)
+        subtask.save()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/tasks/search', {'q': 'te'})
+
+        data = response.json()
+        self.assertEqual(data['query'], 'te')
+        self.assertEqual([result['id'] for result in data['results']], [task.id, subtask.id])
+        result = data['results'][0]
+        self.assertEqual(result['snippets']['title'], 'Buy <mark>tea</mark>')
+        self.assertEqual(result['snippets']['description'], 'Puer <mark>tea</mark> from the shop')
+        self.assertEqual(result['url'], task.get_absolute_url())
+        self.assertEqual(data['results'][1]['parent_id'], task.id)
+
+    def test_limits_results(self):
+        Task.objects.bulk_create([self.create_task(title=f'Tea {i}') for i in range(5)])
+
+        self.assertEqual(len(self.client.get('/tasks/search', {'q': 'tea', 'limit': '2'}).json()['results']), 2)
+        with override_settings(TASKS_SEARCH_MAX_LIMIT=3):
+            response = self.client.get('/tasks/search', {'q': 'tea', 'limit': '100'})
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_empty_query_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/tasks/search', {'q': ' "" '})
+
+        self.assertEqual(response.json()['results'], [])
+
+    def test_home_page_has_search_box(self):
+        response = self.client.get('/')
+
+        self.assertContains(response, 'id="search-tasks"')
+
+
+class PerformersTest(UnitTest):
+    def test_suggests_performers_by_prefix(self):
+        self.create_task(performers='Ivan Petrov, Anna').save()
+        self.create_task(performers='ivanna').save()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/tasks/performers/', {'q': 'iva'})
+
+        results = response.json()['results']
+        self.assertEqual([result['name'] for result in results], ['Ivan Petrov', 'ivanna'])
+        self.assertEqual(results[0]['open_task_count'], 1)
+        self.assertEqual(results[0]['workload_url'], f'/tasks/performers/{results[0]["id"]}/')
+
+    def test_empty_query_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/tasks/performers/', {'q': ' '})
+
+        self.assertEqual(response.json()['results'], [])
+
+    def test_shows_workload_of_performer(self):
+        task = self.create_task(performers='Ivan')
+        task.save()
+        completed_task = self.create_task(performers='Ivan')
+        completed_task.save()
+        Task.objects.filter(id=completed_task.id).update(status=Task.Status.COMPLETED)
+        task.refresh_from_db()
+        performer = Performer.objects.get()
+
+        response = self.client.get(f'/tasks/performers/{performer.id}/')
+
+        data = response.json()
+        self.assertEqual((data['task_count'], data['open_task_count']), (2, 1))
+        self.assertEqual(data['planned_workload'], task.planned_labor_intensity.total_seconds())
+        self.assertEqual([open_task['id'] for open_task in data['open_tasks']], [task.id])
+
+    def test_returns_404_for_unknown_performer(self):
+        self.assertEqual(self.client.get('/tasks/performers/1/').status_code, 404)
+
+    def test_performers_input_suggests_names(self):
+        response = self.client.get('/')
+
+        self.assertContains(response, 'list="performer-suggestions"')
+        self.assertContains(response, '<datalist id="performer-suggestions" data-url="/tasks/performers/">')
+
+
+class TaskListTest(UnitTest):
+    def setUp(self):
+        self.tasks = []
+        for i, (deadline, status) in enumerate([('2024-10-03 10:00', 'AS'), ('2024-10-01 10:00', 'PR'),
+                                                ('2024-10-02 10:00', 'AS'), ('2024-10-02 10:00', 'CM')]):
+            task = self.create_task(title=f'Task {i}', deadline=deadline, performers='Ivan' if i % 2 else 'Anna')
+            task.save()
+            self.tasks.append(task)
+        Task.objects.filter(id=self.tasks[1].id).update(status='PR')
+        Task.objects.filter(id=self.tasks[3].id).update(status='CM')
+        self.subtask, self.subsubtask = self.create_task_chain(parent=self.tasks[0], length=2)
+
+    def get_ids(self, **params):
+        response = self.client.get('/tasks/list', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [task['id'] for task in response.json()['results']]
+
+    def get_all_pages(self, **params):
+        ids, cursor = [], None
+        while True:
+            data = self.client.get('/tasks/list', {**params, **({'cursor': cursor} if cursor else {})}).json()
+            ids += [task['id'] for task in data['results']]
+            cursor = data['next']
+            if cursor is None:
+                return ids
+
+    def test_lists_default_fields_by_id(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/tasks/list')
+
+        data = response.json()
+        self.assertEqual([task['id'] for task in data['results']], sorted(Task.objects.values_list('id', flat=True)))
+        self.assertEqual(set(data['results'][0]), {'id', 'parent', 'title', 'status', 'deadline'})
+        self.assertIsNone(data['next'])
+
+    def test_loads_only_requested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/tasks/list', {'fields': 'title,planned_labor_intensity', 'sort': 'deadline'})
+
+        self.assertNotIn('description', queries[0]['sql'])
+        self.assertEqual(set(response.json()['results'][0]), {'title', 'planned_labor_intensity'})
+        self.assertIsInstance(response.json()['results'][0]['planned_labor_intensity'], float)
+
+    def test_filters_tasks(self):
+        task, in_progress_task, other_task, completed_task = self.tasks
+
+        self.assertEqual(self.get_ids(status='PR,CM'), [in_progress_task.id, completed_task.id])
+        self.assertNotIn(completed_task.id, self.get_ids(open='1'))
+        self.assertEqual(self.get_ids(deadline_after='2024-10-02 00:00', deadline_before='2024-10-03 00:00',
+                                      parent='root'),
+                         [other_task.id, completed_task.id])
+        self.assertEqual(self.get_ids(performer='ivan'), [in_progress_task.id, completed_task.id])
+        self.assertEqual(self.get_ids(performer=str(Performer.objects.get(key='anna').id)),
+                         [task.id, other_task.id])
+        self.assertEqual(self.get_ids(parent='root'), [task.id for task in self.tasks])
+        self.assertEqual(self.get_ids(parent=str(task.id)), [self.subtask.id])
+        self.assertEqual(self.get_ids(subtree_of=str(task.id)), [task.id, self.subtask.id, self.subsubtask.id])
+        self.assertEqual(self.get_ids(subtree_of=str(self.subtask.id), status='AS'),
+                         [self.subtask.id, self.subsubtask.id])
+        self.assertEqual(self.get_ids(subtree_of='999'), [])
+
+    def test_sorts_tasks(self):
+        task, in_progress_task, other_task, completed_task = self.tasks
+
+        self.assertEqual(self.get_ids(sort='deadline', parent='root'),
+                         [in_progress_task.id, other_task.id, completed_task.id, task.id])
+        self.assertEqual(self.get_ids(sort='-deadline', parent='root'),
+                         [task.id, completed_task.id, other_task.id, in_progress_task.id])
+        self.assertEqual(self.get_ids(sort='-id'), sorted(Task.objects.values_list('id', flat=True), reverse=True))
+
+    def test_paginates_with_cursor(self):
+        for sort in ('id', '-id', 'deadline', '-deadline', 'created_at', '-created_at'):
+            with self.subTest(sort=sort):
+                self.assertEqual(self.get_all_pages(sort=sort, limit='1'), self.get_ids(sort=sort))
+                self.assertEqual(self.get_all_pages(sort=sort, limit='2', status='AS'),
+                                 self.get_ids(sort=sort, status='AS'))
+
+    def test_every_page_runs_the_same_query_plan(self):
+        response = self.client.get('/tasks/list', {'sort': 'deadline', 'limit': '2'})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/tasks/list', {'sort': 'deadline', 'limit': '2', 'cursor': response.json()['next']})
+
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+        self.assertIn('LIMIT 3', queries[0]['sql'])
+
+    def test_filters_and_sorts_use_indexes(self):
+        cursor = self.client.get('/tasks/list', {'sort': 'deadline', 'limit': '1'}).json()['next']
+        # Listing everything by id reads the table in id order and stops at the limit
+        for params in [{'cursor': self.client.get('/tasks/list', {'limit': '1'}).json()['next']}, {'status': 'AS,PR'}, {'open': '1', 'sort': 'deadline'}, {'sort': '-created_at'},
+                       {'deadline_after': '2024-10-02 00:00', 'sort': 'deadline'}, {'performer': 'ivan'}, {'parent': 'root'},
+                       {'parent': str(self.tasks[0].id), 'sort': 'created_at'},
+                       {'subtree_of': str(self.tasks[0].id)}, {'sort': 'deadline', 'cursor': cursor}]:
+            with self.subTest(params=params):
+                tasks, sort, fields = list_queryset(params)
+                self.assertUsesIndexes(tasks)
+
+    def test_rejects_invalid_parameters(self):
+        for params in [{'status': 'XX'}, {'deadline_after': 'tomorrow'}, {'parent': 'first'}, {'subtree_of': 'all'},
+                       {'sort': 'title'}, {'fields': 'id,secret'}, {'cursor': 'nonsense'},
+                       {'sort': 'deadline', 'cursor': self.client.get('/tasks/list', {'limit': '1'}).json()['next']}]:
+            with self.subTest(params=params):
+                response = self.client.get('/tasks/list', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params if 'cursor' not in params else ['cursor'])),
+                              response.json()['errors'])
+
+
+@override_settings(ROOT_URLCONF='DMD_task_management_system.asgi_urls')
+class AsyncViewsTest(UnitTest):
+    def setUp(self):
+        self.task = self.create_task()
+        self.task.save()
+        self.subtask, = self.create_task_chain(parent=self.task, length=1)
+
+    async def test_renders_home_page(self):
+        response = await self.async_client.get('/')
+
+        self.assertIs(response.resolver_match.func, async_views.home_page)
+        self.assertContains(response, 'Buy tea')
+        self.assertEqual(response['X-Query-Count'], '1')
+
+    async def test_counts_queries_of_concurrent_requests_separately(self):
+        responses = await asyncio.gather(*(self.async_client.get(f'/tasks/{self.task.id}/json') for _ in range(3)))
+
+        self.assertEqual([response['X-Query-Count'] for response in responses], ['5'] * 3)
+        self.assertEqual(await sync_to_async(lambda: connection.execute_wrappers)(), [])
+
+    async def test_renders_task_detail(self):
+        response = await self.async_client.get(f'/tasks/{self.task.id}/')
+
+        self.assertIs(response.resolver_match.func, async_views.task_detail)
+        self.assertEqual(response.context['task_detail_form'].instance, self.task)
+        self.assertContains(response, 'Subtask 0')
+
+    async def test_renders_task_detail_for_ajax(self):
+        response = await self.async_client.get(f'/tasks/{self.task.id}/',
+                                               headers={'X-Requested-With': 'XMLHttpRequest'})
+
+        data = response.json()
+        self.assertEqual(data['url'], f'/tasks/{self.task.id}/')
+        self.assertIn('Subtask 0', data['form'])
+
+    async def test_returns_404_for_unknown_task(self):
+        response = await self.async_client.get('/tasks/999/')
+
+        self.assertEqual(response.status_code, 404)
+
+    async def test_saves_task_detail_through_sync_view(self):
+        response = await self.async_client.post(f'/tasks/{self.task.id}/',
+                                                data={**UnitTest.VALID_TASK_DATA, 'title': 'Buy oolong'})
+
+        self.assertRedirects(response, f'/tasks/{self.task.id}/', fetch_redirect_response=False)
+        self.assertEqual((await Task.objects.aget(id=self.task.id)).title, 'Buy oolong')
+
+    async def test_returns_same_json_and_etag_as_sync_view(self):
+        with self.settings(ROOT_URLCONF='DMD_task_management_system.urls'):
+            sync_response = await sync_to_async(self.client.get)(f'/tasks/{self.task.id}/json')
+        response = await self.async_client.get(f'/tasks/{self.task.id}/json')
+
+        self.assertEqual(response.json(), sync_response.json())
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        response = await self.async_client.get(f'/tasks/{self.task.id}/json',
+                                               headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_lists_tasks(self):
+        response = await self.async_client.get('/tasks/list', {'subtree_of': str(self.task.id), 'limit': '1'})
+
+        data = response.json()
+        self.assertEqual([task['id'] for task in data['results']], [self.task.id])
+        response = await self.async_client.get('/tasks/list', {'subtree_of': str(self.task.id),
+                                                               'cursor': data['next']})
+        self.assertEqual([task['id'] for task in response.json()['results']], [self.subtask.id])
+        response = await self.async_client.get('/tasks/list', {'sort': 'title'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_renders_subtasks(self):
+        response = await self.async_client.get(f'/tasks/{self.task.id}/subtasks/')
+
+        self.assertIs(response.resolver_match.func, async_views.subtasks)
+        self.assertContains(response, 'Subtask 0')
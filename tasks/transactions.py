@@ -0,0 +1,27 @@
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+
+def is_locked(error):
+    # SQLite reports "database is locked" once the busy timeout runs out, and
+    # "database table is locked" for the shared cache of in-memory databases
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+def retry_when_locked(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(settings.TASKS_WRITE_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                # Inside an outer transaction only its owner can start it over
+                if not is_locked(e) or connection.in_atomic_block or attempt == settings.TASKS_WRITE_RETRIES:
+                    raise
+            # Jitter keeps the writers that collided from retrying in lockstep
+            time.sleep(settings.TASKS_WRITE_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+    return wrapper
@@ -6,6 +6,18 @@ from tasks.views import new_task
 urlpatterns = [
     path('new', views.new_task, name='new_task'),
     path('<int:task_id>/', views.task_detail, name='task_detail'),
+    path('<int:task_id>/json', views.task_json, name='task_json'),
+    path('<int:task_id>/subtasks/', views.subtasks, name='subtasks'),
     path('<int:task_id>/subtasks/new', views.new_subtask, name='new_subtask'),
+    path('<int:task_id>/export.<str:export_format>', views.export_tasks, name='export_subtree'),
+    path('export.<str:export_format>', views.export_tasks, name='export_tasks'),
+    path('list', views.task_list, name='task_list'),
+    path('search', views.search_tasks, name='search_tasks'),
+    path('performers/', views.performers, name='performers'),
+    path('performers/<int:performer_id>/', views.performer_workload, name='performer_workload'),
+    path('roots/', views.subtasks, name='root_tasks'),
     path('<int:task_id>/delete', views.delete_task, name='delete_task'),
+    path('sidebar-cache-stats', views.sidebar_cache_stats, name='sidebar_cache_stats'),
+    path('rollup-queue-stats', views.rollup_queue_stats, name='rollup_queue_stats'),
+    path('metrics', views.request_metrics, name='request_metrics'),
 ]
\ No newline at end of file
@@ -1,28 +1,68 @@
+import hashlib
+
 from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
+from django.conf import settings
 from django.contrib import messages
-
-from .models import Task
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .cache import get_sidebar_stats
+from .export import CONTENT_TYPES, export_lines
+from .instrumentation import query_budget, summary
+from .listing import list_tasks
+from .models import Performer, RollupJob, Task
 from .forms import TaskForm
+from .search import search
+from .serializers import serialize_performer, serialize_search_result, serialize_task, serialize_workload
+
+
+def get_tree_options():
+    return {'depth': settings.TASKS_SIDEBAR_DEPTH,
+            'page_size': settings.TASKS_SIDEBAR_PAGE_SIZE if settings.TASKS_SIDEBAR_DEPTH else None}
+
+
+def load_tree(root=None):
+    return Task.objects.tree(root=root, **get_tree_options())
 
 
+def get_home_page_context(**context):
+    context.setdefault('task_form', TaskForm())
+    context['task_template_form'] = TaskForm()
+    context['tasks'] = SimpleLazyObject(load_tree)
+    return context
+
+
+def render_home_page(request, **context):
+    task_detail_form = context.get('task_detail_form')
+    if task_detail_form is not None:
+        load_tree(root=task_detail_form.instance)
+
+    return render(request, 'tasks/home.html', get_home_page_context(**context))
+
+
+@query_budget(1)
 def home_page(request):
-    return render(request,'tasks/home.html', {'task_form': TaskForm()})
+    return render_home_page(request)
 
 
+@query_budget(6)
 def new_task(request):
     task_form = TaskForm(data=request.POST)
     if task_form.is_valid():
         task_form.save()
         return redirect('/')
     else:
-        return render(request,'tasks/home.html', {'task_form': task_form})
+        return render_home_page(request, task_form=task_form)
 
 
+@query_budget(8)
 def new_subtask(request, task_id):
-    task = get_object_or_404(Task, id=task_id)
+    task = get_object_or_404(Task.objects.with_stale_totals(), id=task_id)
 
     subtask_form = TaskForm(data=request.POST)
     if subtask_form.is_valid():
@@ -30,16 +70,16 @@ def new_subtask(request, task_id):
         subtask_form.save()
         return redirect(task)
 
-    return render(request, 'tasks/home.html', {'task_form': TaskForm(),
-                                                'task_detail_form': TaskForm(instance=task),
-                                                'subtask_form': subtask_form})
+    return render_home_page(request, task_detail_form=TaskForm(instance=task), subtask_form=subtask_form)
 
 
+@query_budget(10)
 def task_detail(request, task_id):
-    task = get_object_or_404(Task, id=task_id)
+    task = get_object_or_404(Task.objects.with_stale_totals(), id=task_id)
 
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     if is_ajax:
+        load_tree(root=task)
         form = render_to_string('tasks/task_detail.html',
                                 {'task_detail_form': TaskForm(instance=task), 'subtask_form': TaskForm()},
                                 request=request)
@@ -56,19 +96,137 @@ def task_detail(request, task_id):
                 except ValidationError as e:
                     task_detail_form.add_error(None, e)
 
-        return render(request, 'tasks/home.html', {'task_form': TaskForm(),
-                                                   'task_detail_form': task_detail_form,
-                                                    'subtask_form': TaskForm()})
+        return render_home_page(request, task_detail_form=task_detail_form, subtask_form=TaskForm())
+
+
+def get_etag_tasks(task_id):
+    # The detail shows the task and its direct subtasks. Every edit bumps a row's version, and
+    # rollups change its totals, queued ones mark them stale until then. Tasks also become
+    # overdue as time goes by, without any write.
+    return (Task.objects.filter(Q(id=task_id) | Q(parent_id=task_id)).with_stale_totals()
+                        .only('id', 'version', 'path', *Task.SUBTREE_TOTAL_FIELDS).order_by('id'))
+
+
+def hash_etag(tasks, overdue_count):
+    versions = [(task.id, task.version, task.stale_totals,
+                 *(getattr(task, field) for field in Task.SUBTREE_TOTAL_FIELDS))
+                for task in tasks]
+    return hashlib.sha1(repr((versions, overdue_count)).encode()).hexdigest()
+
+
+def task_etag(request, task_id):
+    tasks = list(get_etag_tasks(task_id))
+    task = next((task for task in tasks if task.id == task_id), None)
+    if task is None:
+        return None
+    return hash_etag(tasks, task.get_overdue_count())
+
+
+@query_budget(5)
+@cache_control(no_cache=True)
+@condition(etag_func=task_etag)
+def task_json(request, task_id):
+    task = get_object_or_404(Task.objects.with_stale_totals(), id=task_id)
+    subtasks = task.task_set.annotate(subtask_count=Count('task')).order_by('id')
+    return JsonResponse(serialize_task(task, subtasks, task.get_overdue_count()))
+
+
+@query_budget(1)
+def export_tasks(request, export_format, task_id=None):
+    if export_format not in CONTENT_TYPES:
+        raise Http404
+    task = get_object_or_404(Task, id=task_id) if task_id is not None else None
 
+    lines = export_lines(export_format, task,
+                         subtree=request.GET.get('subtree') != '0',
+                         chunk_size=settings.TASKS_EXPORT_CHUNK_SIZE)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[export_format])
+    filename = f'task-{task_id}' if task_id is not None else 'tasks'
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
 
+
+def get_list_limit(request):
+    limit = request.GET.get('limit', '')
+    return min(max(int(limit), 1), settings.TASKS_LIST_MAX_LIMIT) if limit.isdigit() else settings.TASKS_LIST_LIMIT
+
+
+@query_budget(1)
+def task_list(request):
+    try:
+        return JsonResponse(list_tasks(request.GET, get_list_limit(request)))
+    except ValidationError as e:
+        return JsonResponse({'errors': e.message_dict}, status=400)
+
+
+@query_budget(1)
+def search_tasks(request):
+    limit = request.GET.get('limit', '')
+    limit = min(int(limit), settings.TASKS_SEARCH_MAX_LIMIT) if limit.isdigit() else settings.TASKS_SEARCH_LIMIT
+    query = request.GET.get('q', '')
+    results = search(query, limit, prefix=request.GET.get('prefix') != '0')
+    return JsonResponse({'query': query, 'results': [serialize_search_result(task) for task in results]})
+
+
+@query_budget(1)
+def performers(request):
+    query = request.GET.get('q', '').strip()
+    performers = []
+    if query:
+        performers = Performer.objects.autocomplete(query).with_workload()[:settings.TASKS_PERFORMER_SUGGESTIONS]
+    return JsonResponse({'query': query, 'results': [serialize_performer(performer) for performer in performers]})
+
+
+@query_budget(2)
+def performer_workload(request, performer_id):
+    performer = get_object_or_404(Performer.objects.with_workload(), id=performer_id)
+    open_tasks = performer.get_open_tasks().only('id', 'title', 'status', 'deadline', 'planned_labor_intensity')
+    return JsonResponse(serialize_workload(performer, open_tasks))
+
+
+@query_budget(20)
 def delete_task(request, task_id):
     task = get_object_or_404(Task, id=task_id)
     if 'delete' in request.POST:
-        task.delete()
+        if 'cascade' in request.POST:
+            task.delete_subtree(chunk_size=settings.TASKS_DELETE_CHUNK_SIZE)
+        else:
+            task.delete()
         return redirect('/')
     else:
         messages.error(request, 'Error deleting the task')
 
-    return render(request, 'tasks/home.html', {'task_form': TaskForm(),
-                                                'task_detail_form': TaskForm(instance=task),
-                                                'subtask_form': TaskForm()})
+    return render_home_page(request, task_detail_form=TaskForm(instance=task), subtask_form=TaskForm())
+
+
+def get_subtasks_context(task_id, tasks, has_more):
+    for task in tasks:
+        task._subtasks = []
+    return {'parent_id': task_id, 'tasks': tasks, 'has_more': has_more}
+
+
+@query_budget(2)
+def subtasks(request, task_id=None):
+    if task_id is not None:
+        get_object_or_404(Task, id=task_id)
+
+    after = request.GET.get('after', '')
+    tasks, has_more = Task.objects.page(task_id,
+                                        after=int(after) if after.isdigit() else None,
+                                        page_size=settings.TASKS_SIDEBAR_PAGE_SIZE)
+    return render(request, 'tasks/subtasks.html', get_subtasks_context(task_id, tasks, has_more))
+
+
+@query_budget(0)
+def sidebar_cache_stats(request):
+    return JsonResponse(get_sidebar_stats())
+
+
+@query_budget(1)
+def rollup_queue_stats(request):
+    return JsonResponse(RollupJob.objects.stats())
+
+
+@query_budget(0)
+def request_metrics(request):
+    return JsonResponse(summary.get())